@@ -9,7 +9,13 @@ import os
 import re
 import filecmp
 import EE20084_functions_01 as EE84
+import warnings
+import traceback
+import contextlib
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+programs={}
 
 def test_char_by_char(logfile,nline,l1,l2):
     """ Test for equality, character by character, between two lines of text
@@ -24,15 +30,9 @@ def test_char_by_char(logfile,nline,l1,l2):
     nc2=len(l2)
     # print("L1(%d)=<%s>\nL2(%d)=<%s>"%(nc1,l1,nc2,l2))
     if (nc1==nc2):
-        jjdiff=-1
-        err_found=False
-        for jj in range(0,nc1):
-            same=l1[jj]==l2[jj]
-            if ((not same) and (not err_found)):
-                jjdiff=jj
-                err_found=True
-                #st="Characters <%s> and <%s> differ at char %d\n"%(l1[jj],l2[jj],jj)
-                #logfile.write(st)
+        err_found=l1!=l2
+        # the first difference is where the common prefix ends
+        jjdiff=len(os.path.commonprefix([l1,l2])) if err_found else -1
         if (err_found):
             st="Error found in line %d from character %d\n"%(nline,jjdiff)
             logfile.write(st)
@@ -86,9 +86,33 @@ def test_float_equality(logfile,nline,l1,l2,atol,rtol):
         logfile.write(st)
     return(error_in_line)
 
+def find_float_errors(lines1,lines2,atol,rtol):
+    """ Find the data lines test_float_equality reports as different, without testing them one at a time
+    The values of every line of both files are converted into two arrays in one pass and compared with one isclose call.
+    :param lines1 - data lines of text from file one
+    :param lines2 - data lines of text from file two, as many as lines1
+    :param atol - absolute tolerance for isclose equality test
+    :param rtol - relative tolerance for isclose equality test
+    :return - numpy array of bool, True for each line that test_float_equality finds a difference in
+    """
+    split1=[line.split(",") for line in lines1]
+    split2=[line.split(",") for line in lines2]
+    nterms1=np.fromiter((len(l1s)-1 for l1s in split1),dtype=int,count=len(split1))     #as comma is expected at end of a data line
+    nterms2=np.fromiter((len(l2s)-1 for l2s in split2),dtype=int,count=len(split2))
+    same_count=(nterms1==nterms2)
+    values1=[value for l1s,same in zip(split1,same_count) if same for value in l1s[:-1]]
+    values2=[value for l2s,same in zip(split2,same_count) if same for value in l2s[:-1]]
+    v1=np.fromiter(map(float,values1),dtype=float,count=len(values1))
+    v2=np.fromiter(map(float,values2),dtype=float,count=len(values2))
+    ok=np.isclose(v1,v2,atol,rtol)
+    line_of_value=np.repeat(np.flatnonzero(same_count),nterms1[same_count])
+    differences=np.bincount(line_of_value[~ok],minlength=len(lines1))
+    return((~same_count) | (differences>0))
+
 def test_equality(logfile,f1,f2,atol,rtol):
     """ Test for equality between contents of two output (.csv) files
     When differences are found files are compared character by character and float by float to identify where first difference occurs
+    All the data lines are compared at once by find_float_errors, only the lines with a difference are tested one at a time for the log
         Outputs messages to log file.
     :param logfile - file pointer to opened file for log messages
     :param f1 - text contents of file one
@@ -110,7 +134,16 @@ def test_equality(logfile,f1,f2,atol,rtol):
         err_file=line1_err or err_file
         line2_err=test_char_by_char(logfile,2, f1split[1], f2split[1])
         err_file=line2_err or err_file
+        try:
+            line_errors=find_float_errors(f1split[2:],f2split[2:],atol,rtol)
+        except ValueError:
+            # Not all values are numbers, test line by line so the log stops where float() fails
+            line_errors=None
         for iline in range(2,nlines1):
+            if ((line_errors is not None) and (not line_errors[iline-2])):
+                st="Line %d is OK\n"%(iline+1)
+                logfile.write(st)
+                continue
             float_err=test_float_equality(logfile, (iline+1), f1split[iline], f2split[iline], atol, rtol)
             err_file=float_err or err_file
             if (float_err):
@@ -124,147 +157,225 @@ def test_equality(logfile,f1,f2,atol,rtol):
     
 
 
-def run_tests(test_names,atol,rtol):
-    """ Run a set of tests with the same absolute and relative tolerances
-    Calls test_equality to make the equality test between contents of two output (.csv) files
-        Opens log file to catch log messages.
-    :param test_names - list of data file names - input and output filenames are generated from this
+def load_program(program):
+    """ Compile the program under test once per process
+    Its directory is put at the start of sys.path, as python does when it runs a script.
+    :param program - file name of the program
+    :return - code object of the program
+    """
+    if program not in programs:
+        sys.path.insert(0,os.path.dirname(os.path.abspath(program)))
+        with open(program,"rb") as source:
+            programs[program]=compile(source.read(),program,"exec")
+    return(programs[program])
+
+def run_in_process(program,net_file,output_file,run_log):
+    """ Run the program on one net file inside this interpreter, in place of python program net_file output_file
+    The program is run as __main__ with the same sys.argv, the modules it imports (numpy and the
+    solver itself) are imported once and then reused. Everything the program prints, and the
+    traceback if it fails, goes to the run log as it does from the command line.
+    :param program - file name of the program
+    :param net_file - input file name
+    :param output_file - output file name
+    :param run_log - file name for the printed output
+    :return - The exit status the program would have returned, 0 for success
+    """
+    status=0
+    saved_argv=sys.argv
+    with open(run_log,"wt") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        with warnings.catch_warnings():
+            # Show every warning again, as a new interpreter would
+            warnings.simplefilter("default")
+            try:
+                sys.argv=[program,net_file,output_file]
+                exec(load_program(program),{"__name__":"__main__","__file__":program,"__builtins__":__builtins__})
+            except SystemExit as exit_request:
+                status=exit_request.code
+                if (status is not None and not isinstance(status,int)):
+                    # sys.exit("message") prints the message and returns 1
+                    print(status,file=sys.stderr)
+                    status=1
+            except Exception as error:
+                # The traceback starts in the program, as it does from the command line
+                traceback.print_exception(type(error),error,error.__traceback__.tb_next)
+                status=1
+            finally:
+                sys.argv=saved_argv
+    return(0 if status is None else status)
+
+def run_test(program,basename,atol,rtol,in_process=False):
+    """ Run one test and compare its output file with the model file
+    Writes the run log and the compare log of the test, so tests can run in separate processes.
+    :param program - the program under test, run as python program net_file output_file
+    :param basename - data file name - input and output filenames are generated from this
     :param atol - absolute tolerance for isclose equality test
     :param rtol - relative tolerance for isclose equality test
+    :param in_process - call the program with run_in_process rather than starting a new python for it
+    :return - Output file name, True if it agrees with the model file and the messages to print
+    """
+    net_file="./User_files/%s.net"%(basename)
+    output_file="./User_files/%s.csv"%(basename)
+    run_log="./User_files/%s_run.log"%(basename)
+    model_file="./Model_files/%s_model.csv"%(basename)
+    compare_log="./User_files/%s_compare.log"%(basename)
+    messages=[]
+    cf_file=EE84.My_open_file(compare_log,"wt")
+    st='python %s %s %s >%s 2>&1'%(program,net_file,output_file,run_log)
+    messages.append("Command is:%s\n"%(st))
+    stc=("Command is:%s\n"%(st))
+    cf_file.write(stc)
+    if (in_process):
+        prog_rtn=run_in_process(program,net_file,output_file,run_log)
+        st="Program returns %r from in-process execution of command\n"%(prog_rtn)
+    else:
+        os_rtn=os.system(st)
+        st="OS returns %r from execution of command\n"%(os_rtn)
+    messages.append(st)
+    cf_file.write(st)
+    correct=compare_output(cf_file,model_file,output_file,atol,rtol)
+    cf_file.close()
+    return(output_file, correct, messages)
+
+def compare_output(cf_file,model_file,output_file,atol,rtol):
+    """ Compare an output file with its model file
+    Uses filecmp first and test_equality only when the files are not identical.
+    :param cf_file - file pointer to opened file for log messages
+    :param model_file - name of the model output file
+    :param output_file - name of the output file under test
+    :param atol - absolute tolerance for isclose equality test
+    :param rtol - relative tolerance for isclose equality test
+    :return - True if the output file agrees with the model file
+    """
+    op=filecmp.cmp(model_file, output_file)
+    st=("For files %s and %s filecmp returns same=%r\n"%(model_file, output_file, op))
+    cf_file.write(st)
+    correct=op
+    if (not op):
+        st=("\t\t\tDetailed testing:\n")
+        cf_file.write(st)
+        file_1=EE84.My_open_file(model_file,"rt")
+        file_2=EE84.My_open_file(output_file,"rt")
+        buff1=file_1.read()
+        buff2=file_2.read()
+        unequal=test_equality(cf_file,buff1,buff2,atol,rtol)
+        correct=not unequal
+        file_1.close()
+        file_2.close()
+    return(correct)
+
+def count_results(results):
+    """ Add up the results of a set of tests, printing the messages of each test in turn
+    :param results - iterable of run_test results, in the order of the tests
     :return - Number of identical files found, number of files examined, List of correct files and list of incorrect files
     """
     correct_f=0
     f_examined=0
     c_list=[]
     i_list=[]
-    for basename in test_names:
-        net_file="./User_files/%s.net"%(basename)
-        output_file="./User_files/%s.csv"%(basename)
-        run_log="./User_files/%s_run.log"%(basename)
-        model_file="./Model_files/%s_model.csv"%(basename)
-        compare_log="./User_files/%s_compare.log"%(basename)
-        cf_file=EE84.My_open_file(compare_log,"wt")
-        st='python %s %s %s >%s 2>&1'%(sys.argv[1],net_file,output_file,run_log)
-        print("Command is:%s\n"%(st))
-        stc=("Command is:%s\n"%(st))
-        cf_file.write(stc)
-        os_rtn=os.system(st)
-        st="OS returns %r from execution of command\n"%(os_rtn)
-        print(st)
-        cf_file.write(st)
-        op=filecmp.cmp(model_file, output_file)
-        st=("For files %s and %s filecmp returns same=%r\n"%(model_file, output_file, op))
-        cf_file.write(st)
+    for output_file, correct, messages in results:
+        for st in messages:
+            print(st)
         f_examined+=1
-        if (op):
+        if (correct):
             correct_f+=1
             c_list.append(output_file)
         else:
-            st=("\t\t\tDetailed testing:\n")
-            cf_file.write(st)
-            file_1=EE84.My_open_file(model_file,"rt")
-            file_2=EE84.My_open_file(output_file,"rt")
-            buff1=file_1.read()
-            buff2=file_2.read()
-            unequal=test_equality(cf_file,buff1,buff2,atol,rtol)
-            if unequal:
-                i_list.append(output_file)
-            else:
-                correct_f+=1
-                c_list.append(output_file)
-            file_1.close()
-            file_2.close()
-        cf_file.close()
+            i_list.append(output_file)
     return(correct_f, f_examined, c_list, i_list)
 
+def run_tests(test_names,atol,rtol,in_process=False):
+    """ Run a set of tests with the same absolute and relative tolerances
+    Calls test_equality to make the equality test between contents of two output (.csv) files
+        Opens log file to catch log messages.
+    :param test_names - list of data file names - input and output filenames are generated from this
+    :param atol - absolute tolerance for isclose equality test
+    :param rtol - relative tolerance for isclose equality test
+    :param in_process - run the program inside this interpreter (see run_in_process)
+    :return - Number of identical files found, number of files examined, List of correct files and list of incorrect files
+    """
+    return(count_results(run_test(sys.argv[1],basename,atol,rtol,in_process) for basename in test_names))
+
+def run_suites(suites,atol,rtol,workers,in_process=False):
+    """ Run every test of every suite on a pool of worker processes
+    All the tests are handed to the pool at once, so the suites overlap as well as the tests in
+    each suite. The results are collected in the order of the tests, so the totals, lists and
+    messages are the same as running the suites one after another with run_tests.
+    :param suites - list of lists of data file names
+    :param atol - absolute tolerance for isclose equality test
+    :param rtol - relative tolerance for isclose equality test
+    :param workers - number of worker processes
+    :param in_process - run the program inside the worker processes (see run_in_process)
+    :return - Generator of run_tests results, one per suite, each given as soon as its suite is done
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures=[[pool.submit(run_test,sys.argv[1],basename,atol,rtol,in_process) for basename in test_names] for test_names in suites]
+        for suite_futures in futures:
+            yield(count_results(future.result() for future in suite_futures))
+
 
 
 def usage():
-    print("Command line should be:\npython AutoTest.py MyProg.py Abs_tol Rel_tol\n")
+    print("Command line should be:\npython AutoTest.py [--in-process] MyProg.py Abs_tol Rel_tol [Workers]\n")
     print("Files need to be in subdirectories of the directory containing Autotest.py and MyProg.py.\nThe input *.net files from the Moodle site should be in a subdirectory called User_files.\nThe output files from MyProg.py will be written to the subdirectory called User_files\n")
     print("Autotest compares the output files in User_files with the model output files in Model_files.")
     print("Autotest will run MyProg.py through all of the a_*, b_*, c_*, d_* and e_* example files from the Moodle site.")
     print("Autotest first uses filecmp to see if the user and model output files are identical.")
     print("If the files are not identical detailed character by character and value by value comparisons are made. The value by value tests are made using numpy.isclose() to see if values are similar enough. This comparison is controlled by the parameters Abs_tol and Rel_tol. The smaller these values the better the agreement needs to be between the model and user output files in order to pass the test. Typically 1.0e-13 is used for both to overcome numeric rounding uncertainty in floating point calculations.")
     print("At the end of the tests a summary is given showing how many files were examined, how many of the files correctly agreed with the model output files and how many were incorrect or different. A summary of the correct and incorrect file names is also printed.")
+    print("Workers is optional, with a number above 1 the tests are run on that many worker processes at once. Each test still writes its own *_run.log and *_compare.log files, and the summary is the same as running the tests one after another.")
+    print("With --in-process MyProg.py is run as __main__ inside the test program for each file, rather than starting a new python for every file, so modules such as numpy are only imported once. What it prints still goes to the *_run.log files and the tests pass or fail exactly as they do otherwise.")
     print("After running the tests the User_files directory contains *_compare.log files containing some detail of the test, and in particular where the output files differ.")
     print("%s\n"%('*'*80))      
         
 
-nargs=len(sys.argv)
-print("This is the name of the script: ", sys.argv[0])
-print( "Number of arguments: ", len(sys.argv) )
-print( "The arguments are: " , str(sys.argv) )
-
-if (nargs<4):
-    print("\n\t\tWrong number of arguments")
-    usage()
-    sys.exit(1)
-Abs_tol=float(sys.argv[2])
-Rel_tol=float(sys.argv[3])
-print("Tolerances are Abs=%g, Rel=%g"%(Abs_tol,Rel_tol))
-correct_files=0
-incorrect_files=0
-files_examined=0
-correct_list=[]
-incorrect_list=[]
-divider_line='*'*80
 a_tests=["a_Test_Circuit_1", "a_Test_Circuit_1BRX", "a_Test_Circuit_1dB", "a_Test_Circuit_1M", "a_Test_Circuit_1nF", "a_Test_Circuit_1nT", "a_Test_Circuit_1Ord"]
-ncorr,nexam,clist,ilist=run_tests(a_tests,Abs_tol,Rel_tol)
-print("%s\nA_test: %d files tested, %d correct, %d incorrect"%(divider_line,nexam, ncorr,(nexam-ncorr)))
-print("Correct files are:",clist)
-print("Incorrect files are:",ilist)
-print(divider_line)
-correct_files+=ncorr
-files_examined+=nexam
-correct_list.append(clist)
-incorrect_list.append(ilist)
 b_tests=["b_CR", "b_RC", "b_Pi_03", "b_Pi_03R", "b_Tee_03", "b_Tee_03R"]
-ncorr,nexam,clist,ilist=run_tests(b_tests,Abs_tol,Rel_tol)
-print("%s\nB_test: %d files tested, %d correct, %d incorrect"%(divider_line,nexam, ncorr,(nexam-ncorr)))
-print("Correct files are:",clist)
-print("Incorrect files are:",ilist)
-print(divider_line)
-correct_files+=ncorr
-files_examined+=nexam
-correct_list.append(clist)
-incorrect_list.append(ilist)
 c_tests=["c_LCR", "c_LCG"]
-ncorr,nexam,clist,ilist=run_tests(c_tests,Abs_tol,Rel_tol)
-print("%s\nC_test: %d files tested, %d correct, %d incorrect"%(divider_line,nexam, ncorr,(nexam-ncorr)))
-print("Correct files are:",clist)
-print("Incorrect files are:",ilist)
-print(divider_line)
-correct_files+=ncorr
-files_examined+=nexam
-correct_list.append(clist)
-incorrect_list.append(ilist)
 d_tests=["d_LPF_B50", "d_LPF_B75", "d_LPF_B750", "d_LPF_Bess350", "d_LPF_C550"]
-ncorr,nexam,clist,ilist=run_tests(d_tests,Abs_tol,Rel_tol)
-print("%s\nD_test: %d files tested, %d correct, %d incorrect"%(divider_line,nexam, ncorr,(nexam-ncorr)))
-print("Correct files are:",clist)
-print("Incorrect files are:",ilist)
-print(divider_line)
-correct_files+=ncorr
-files_examined+=nexam
-correct_list.append(clist)
-incorrect_list.append(ilist)
 e_tests=["e_Ladder_100", "e_Ladder_400"]
-ncorr,nexam,clist,ilist=run_tests(e_tests,Abs_tol,Rel_tol)
-print("%s\nE_test: %d files tested, %d correct, %d incorrect"%(divider_line,nexam, ncorr,(nexam-ncorr)))
-print("Correct files are:",clist)
-print("Incorrect files are:",ilist)
-print(divider_line)
-correct_files+=ncorr
-files_examined+=nexam
-correct_list.append(clist)
-incorrect_list.append(ilist)
+suite_names=["A_test", "B_test", "C_test", "D_test", "E_test"]
+suites=[a_tests, b_tests, c_tests, d_tests, e_tests]
 
+if __name__ == "__main__":
+    nargs=len(sys.argv)
+    print("This is the name of the script: ", sys.argv[0])
+    print( "Number of arguments: ", len(sys.argv) )
+    print( "The arguments are: " , str(sys.argv) )
+    In_process='--in-process' in sys.argv
+    sys.argv=[arg for arg in sys.argv if arg!='--in-process']
+    nargs=len(sys.argv)
+
+    if (nargs<4):
+        print("\n\t\tWrong number of arguments")
+        usage()
+        sys.exit(1)
+    Abs_tol=float(sys.argv[2])
+    Rel_tol=float(sys.argv[3])
+    Workers=int(sys.argv[4]) if nargs>4 else 1
+    print("Tolerances are Abs=%g, Rel=%g"%(Abs_tol,Rel_tol))
+    correct_files=0
+    incorrect_files=0
+    files_examined=0
+    correct_list=[]
+    incorrect_list=[]
+    divider_line='*'*80
+    if (Workers>1):
+        suite_results=run_suites(suites,Abs_tol,Rel_tol,Workers,In_process)
+    else:
+        suite_results=(run_tests(test_names,Abs_tol,Rel_tol,In_process) for test_names in suites)
+    for suite_name, (ncorr,nexam,clist,ilist) in zip(suite_names, suite_results):
+        print("%s\n%s: %d files tested, %d correct, %d incorrect"%(divider_line,suite_name,nexam, ncorr,(nexam-ncorr)))
+        print("Correct files are:",clist)
+        print("Incorrect files are:",ilist)
+        print(divider_line)
+        correct_files+=ncorr
+        files_examined+=nexam
+        correct_list.append(clist)
+        incorrect_list.append(ilist)
 
-incorrect_files=files_examined-correct_files
-print("\n%s\n\t\tTotals\n%d files tested, %d correct, %d incorrect"%(divider_line,files_examined, correct_files,incorrect_files))
-print("Correct files are:",correct_list)
-print("Incorrect files are:",incorrect_list)
-print(divider_line)
 
-      
+    incorrect_files=files_examined-correct_files
+    print("\n%s\n\t\tTotals\n%d files tested, %d correct, %d incorrect"%(divider_line,files_examined, correct_files,incorrect_files))
+    print("Correct files are:",correct_list)
+    print("Incorrect files are:",incorrect_list)
+    print(divider_line)
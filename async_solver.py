@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio front end for the solver
+
+    import asyncio
+    from async_solver import solve_async
+
+    csv_text = await solve_async(netlist_text)
+
+AsyncSolver runs main.solve_text on a bounded executor (a process pool by default,
+or a thread pool) so the event loop is never blocked by parsing or solving, and reads
+and writes .net/.csv files on a small thread pool so file I/O does not block it either.
+At most max_in_flight solves are handed to the executor at once; further callers wait
+(back-pressure) instead of queueing unbounded work, and in_flight/waiting report the
+current load. Many requests in flight overlap their file I/O with the compute of others.
+"""
+import os
+import asyncio
+import importlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import main
+
+
+def _load_library():
+    # Worker initializer, the parser, solver and exporter are imported once per process
+    for module in sorted(set(main.LIBRARY.values())):
+        importlib.import_module(module)
+
+
+def _read_text(file_path):
+    with open(file_path, 'r') as input_file:
+        return input_file.read()
+
+
+def _write_text(file_path, text):
+    # Same bytes as CircResultsExporter.stream_to_csv, an empty result gives an empty file
+    with open(file_path, 'w', newline='') as output_file:
+        output_file.write(text)
+
+
+class AsyncSolver:
+
+    """
+    Bounded executor for solving netlists from asyncio code
+
+    :def solve
+
+        await the csv text of a netlist given as text ('' where main.py would write an empty file)
+
+    :def limit
+
+        The semaphore bounding the solves in flight on one event loop
+
+    :def solve_file
+
+        await solving input_file into output_file, reading and writing off the event loop
+
+    :def close
+
+        shut the executors down (also done by "async with")
+    """
+
+    def __init__(self, max_workers=None, max_in_flight=None, processes=True, io_workers=4):
+        max_workers = max_workers or os.cpu_count() or 1
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_load_library)
+        else:
+            _load_library()
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers)
+        # By default allow two solves per worker so a worker never waits on the event loop
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        # A semaphore belongs to the event loop it is first used on, so each loop (e.g. each
+        # asyncio.run) gets its own, made the first time that loop calls solve
+        self.limits = {}
+        self.in_flight = 0
+        self.waiting = 0
+
+    def limit(self, loop):
+        if loop not in self.limits:
+            # the semaphores of loops that have been closed are no longer needed
+            self.limits = {other: limit for other, limit in self.limits.items() if not other.is_closed()}
+            self.limits[loop] = asyncio.Semaphore(self.max_in_flight)
+        return self.limits[loop]
+
+    async def solve(self, netlist, chunk_size=16384):
+        loop = asyncio.get_running_loop()
+        self.waiting += 1
+        async with self.limit(loop):
+            self.waiting -= 1
+            self.in_flight += 1
+            try:
+                return await loop.run_in_executor(self.executor, main.solve_text, netlist, chunk_size)
+            finally:
+                self.in_flight -= 1
+
+    async def solve_file(self, input_file, output_file, chunk_size=16384):
+        loop = asyncio.get_running_loop()
+        netlist = await loop.run_in_executor(self.io_executor, _read_text, input_file)
+        try:
+            csv_text = await self.solve(netlist, chunk_size)
+        except Exception:
+            # As on the command line an input that cannot be solved gives an empty output file
+            csv_text = ''
+        await loop.run_in_executor(self.io_executor, _write_text, output_file, csv_text)
+        return output_file
+
+    def close(self):
+        self.executor.shutdown()
+        self.io_executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # waiting for the workers to exit is itself done off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+_default_solver = None
+
+
+def default_solver():
+    # Shared AsyncSolver used by solve_async, created on first use
+    global _default_solver
+    if _default_solver is None:
+        _default_solver = AsyncSolver()
+    return _default_solver
+
+
+async def solve_async(netlist, chunk_size=16384):
+    """ Solve the text of a netlist on the shared AsyncSolver
+    :param netlist - text of a .net file
+    :return csv text, '' where main.py would write an empty file
+    """
+    return await default_solver().solve(netlist, chunk_size)
+
+
+async def solve_file_async(input_file, output_file, chunk_size=16384):
+    """ Solve input_file into output_file on the shared AsyncSolver
+    :return output_file
+    """
+    return await default_solver().solve_file(input_file, output_file, chunk_size)
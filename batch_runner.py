@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Solve many netlists in one go on a pool of worker processes
+
+Usage: python batch_runner.py [--periodic] <netlist_dir|manifest> <output_dir> [Workers]
+
+<netlist_dir>  every *.net file in the directory is solved
+<manifest>     text file with one netlist path per line, optionally followed by the
+               output path; blank lines and lines starting with # are ignored
+<output_dir>   where <name>.csv and <name>_run.log are written (unless the manifest
+               gives an output path)
+[Workers]      number of worker processes, defaults to the number of CPUs
+--periodic     cascade repeated runs of identical cells by matrix powers (main.py --periodic)
+
+Each worker imports main.py once and then runs the DataExtract -> Circ ->
+CircResultsExporter pipeline (main.solve_file) for every netlist it is given,
+so the interpreter start-up and the numpy import are paid once per worker
+rather than once per file. A netlist that fails in any way gives an empty
+output file, exactly as running main.py on it would, and does not stop the
+rest of the batch.
+"""
+import sys
+import os
+import io
+import time
+import glob
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def read_jobs(source, output_dir):
+    """ Build the list of (net_file, output_file) pairs to solve
+    :param source - directory of .net files or manifest file
+    :param output_dir - directory for outputs that are not named in the manifest
+    :return list of (string, string)
+    """
+    if os.path.isdir(source):
+        net_files = [[net_file] for net_file in sorted(glob.glob(os.path.join(source, "*.net")))]
+    else:
+        with open(source, 'r') as manifest:
+            net_files = [line.split() for line in manifest if line.strip() and not line.lstrip().startswith('#')]
+    jobs = []
+    for entry in net_files:
+        if len(entry) > 1:
+            output_file = entry[1]
+        else:
+            basename = os.path.splitext(os.path.basename(entry[0]))[0]
+            output_file = os.path.join(output_dir, "%s.csv" % (basename))
+        jobs.append((entry[0], output_file))
+    return jobs
+
+
+def solve_job(net_file, output_file, periodic=False):
+    """ Solve one netlist inside a worker process
+    Everything main.solve_file prints is written to <output>_run.log next to the output.
+    :param net_file - netlist to solve
+    :param output_file - csv file to write
+    :param periodic - passed on to main.solve_file
+    :return (net_file, output_file, status, seconds) where status is 'ok', 'empty' or 'error'
+    """
+    import main
+    start = time.perf_counter()
+    log = io.StringIO()
+    status = 'ok'
+    with contextlib.redirect_stdout(log):
+        try:
+            main.solve_file(net_file, output_file, periodic=periodic)
+        except Exception:
+            # Same as the command line: an input that cannot be solved gives an empty file
+            traceback.print_exc(file=log)
+            status = 'error'
+            try:
+                main.errorexporter(output_file)
+            except OSError:
+                # e.g. the output directory is missing, this job fails but the rest of the batch runs
+                traceback.print_exc(file=log)
+    if status == 'ok' and os.path.getsize(output_file) == 0:
+        status = 'empty'
+    try:
+        with open(os.path.splitext(output_file)[0] + "_run.log", 'w') as run_log:
+            run_log.write(log.getvalue())
+    except OSError:
+        # The log cannot go next to the output either, the status still reports the failure
+        status = 'error'
+    return net_file, output_file, status, time.perf_counter() - start
+
+
+def run_batch(jobs, workers=None, progress=True, periodic=False):
+    """ Solve every job on a pool of worker processes
+    :param jobs - list of (net_file, output_file)
+    :param workers - number of processes, None for one per CPU
+    :param progress - print a line as each file finishes
+    :param periodic - passed on to main.solve_file for every job
+    :return dict mapping status ('ok', 'empty', 'error') to the list of net files with that status
+    """
+    summary = {'ok': [], 'empty': [], 'error': []}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_job, net_file, output_file, periodic) for net_file, output_file in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            net_file, output_file, status, seconds = future.result()
+            summary[status].append(net_file)
+            if progress:
+                print("[%d/%d] %-5s %8.3f s  %s -> %s" % (done, len(jobs), status, seconds, net_file, output_file))
+    elapsed = time.perf_counter() - start
+    divider_line = '*' * 80
+    print("%s\n%d files in %.2f s (%.1f files/s): %d ok, %d empty, %d error"
+          % (divider_line, len(jobs), elapsed, len(jobs) / elapsed if elapsed > 0 else 0.0,
+             len(summary['ok']), len(summary['empty']), len(summary['error'])))
+    if summary['error']:
+        print("Files that raised an error:", sorted(summary['error']))
+    print(divider_line)
+    return summary
+
+
+if __name__ == "__main__":
+    Periodic = '--periodic' in sys.argv
+    Args = [arg for arg in sys.argv[1:] if arg != '--periodic']
+    if len(Args) not in [2, 3]:
+        print("Usage: python batch_runner.py [--periodic] <netlist_dir|manifest> <output_dir> [Workers]")
+        sys.exit(1)
+    Output_dir = Args[1]
+    os.makedirs(Output_dir, exist_ok=True)
+    Jobs = read_jobs(Args[0], Output_dir)
+    run_batch(Jobs, workers=int(Args[2]) if len(Args) > 2 else None, periodic=Periodic)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Timing benchmarks for the circuit solver in main.py
+
+Usage: python benchmark.py [Nfreqs] [Repeats] [Edits]
+
+cascade:     Runs the ladder netlists from User_files through both the original
+             per-frequency cascade (one 2x2 numpy.array per component per frequency)
+             and the batched Circ.MAT_GEN, checks that they agree and prints the
+             time taken by each.
+periodic:    Cascades the ladder netlists with and without periodic run detection
+             (repeated cells raised to a power by squaring).
+incremental: Repeatedly changes the value of one component of e_Ladder_400 and
+             compares a full re-cascade against Circ.update_component.
+array:       Parses and cascades the ladder netlists through the list of dicts, then
+             through a component array (DataExtract as_array).
+kernels:     Builds the impedance of every L and C of e_Ladder_400 with the original
+             per-frequency Z_GEN loop and with the array kernels over the shared omega.
+interning:   Builds the ABCD stacks of the ladder netlists with an empty impedance cache
+             and again once every signature is interned, printing the hit/miss counters.
+plan:        Parses and sorts the ladder netlists, then loads them from a compiled plan
+             (netlist_plan.py, written to a temporary copy of each netlist).
+memory:      Memory taken by one Impedance/FreqDepImpedence object per component
+             against one ComponentTable for the same ladder.
+import:      Times "import main" and "import net_reader" in a fresh interpreter and
+             fails (exit status 1) if either takes longer than IMPORT_BUDGET or
+             pulls in numpy, so start-up cost cannot creep back unnoticed.
+"""
+import os
+import io
+import sys
+import math
+import time
+import shutil
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+import numpy
+import main
+
+LADDER_FILES = ["./User_files/e_Ladder_100.net", "./User_files/e_Ladder_400.net"]
+IMPORT_MODULES = ["main", "net_reader"]
+IMPORT_BUDGET = 0.05  # seconds, for the import alone (not interpreter start-up)
+
+
+def load_circuit(net_file, nfreqs, **options):
+    """ Parse net_file and build its Circ over a linear sweep of nfreqs frequencies
+    :param net_file - netlist to solve
+    :param nfreqs - number of frequencies, replaces Nfreqs from the netlist
+    :param options - keyword arguments passed on to Circ (lazy, incremental, periodic)
+    :return Circ
+    """
+    Txt_Data = main.DataExtract(net_file)
+    terms = Txt_Data.formatted_Term_Values
+    Freq = numpy.linspace(terms['Fstart'], terms['Fend'], nfreqs)
+    components = main.build_components(Txt_Data.formatted_Circ_Values)
+    return main.Circ(components, Freq, terms['RL'], terms['VT'], terms['RS'], **options)
+
+
+def legacy_cascade(circuit):
+    """ The original Circ.MAT_GEN, kept as the reference for the benchmark """
+    MAT = {}
+    for F in circuit.Freq:
+        current_MAT = numpy.array([[1, 0], [0, 1]])
+        for component in circuit.components_list_Ordored:
+            current_MAT = current_MAT @ component.MAT_GEN(F)
+        MAT[F] = current_MAT
+    return MAT
+
+
+def legacy_Z_GEN(component, Freq):
+    """ The original FreqDepImpedence.Z_GEN, one Python complex per frequency """
+    Z = {}
+    if component.Type == "C":
+        for F in Freq:
+            Z[F] = (1/(1j*2*math.pi*F*component.Value))
+    elif component.Type == "L":
+        for F in Freq:
+            Z[F] = (1j*2*math.pi*F*component.Value)
+    return Z
+
+
+def best_time(func, repeats):
+    """ Return the fastest of repeats calls to func, in seconds, and its result """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_cascade(nfreqs, repeats):
+    print("Cascade benchmark, %d frequencies, best of %d" % (nfreqs, repeats))
+    for net_file in LADDER_FILES:
+        circuit = load_circuit(net_file, nfreqs)
+        t_old, old = best_time(lambda: legacy_cascade(circuit), repeats)
+        t_new, new = best_time(circuit.MAT_GEN, repeats)
+        same = all(numpy.array_equal(old[F], new[i]) for i, F in enumerate(circuit.Freq))
+        print("%-32s %4d components  loop %9.4f s  batched %9.4f s  speedup %7.1fx  identical=%r"
+              % (net_file, len(circuit.components_list), t_old, t_new, t_old / t_new, same))
+
+
+def bench_periodic(nfreqs, repeats):
+    print("Periodic benchmark, %d frequencies, best of %d" % (nfreqs, repeats))
+    for net_file in LADDER_FILES:
+        plain = load_circuit(net_file, nfreqs, lazy=True)
+        periodic = load_circuit(net_file, nfreqs, lazy=True, periodic=True)
+        t_plain, old = best_time(plain.MAT_GEN, repeats)
+        t_periodic, new = best_time(periodic.MAT_GEN, repeats)
+        print("%-32s runs %-16s plain %9.4f s  periodic %9.4f s  speedup %7.1fx  allclose=%r"
+              % (net_file, periodic.Find_periodic_runs(), t_plain, t_periodic, t_plain / t_periodic,
+                 numpy.allclose(old, new, rtol=1e-9, atol=0)))
+
+
+def bench_incremental(nfreqs, edits):
+    net_file = LADDER_FILES[-1]
+    print("Incremental benchmark, %s, %d frequencies, %d edits" % (net_file, nfreqs, edits))
+    full = load_circuit(net_file, nfreqs, lazy=True)
+    inc = load_circuit(net_file, nfreqs, lazy=True, incremental=True)
+    inc.Vout  # build the prefix products before timing
+    index = len(inc.components_list_Ordored) // 2
+    Value = inc.components_list_Ordored[index].get_Value()
+    # Tune the component in the middle of the ladder up and down by a few percent
+    values = [Value * (1 + 0.05 * numpy.sin(i)) for i in range(edits)]
+
+    start = time.perf_counter()
+    for v in values:
+        full.components_list_Ordored[index].set_Value(v)
+        full.results.invalidate()
+        full_Vout = full.Vout
+    t_full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for v in values:
+        inc.update_component(index, v)
+        inc_Vout = inc.Vout
+    t_inc = time.perf_counter() - start
+
+    print("full re-solve %9.4f s  incremental %9.4f s  speedup %7.1fx  allclose=%r"
+          % (t_full, t_inc, t_full / t_inc, numpy.allclose(full_Vout, inc_Vout, rtol=1e-9, atol=0)))
+
+
+def bench_array(nfreqs, repeats):
+    print("Component array benchmark, %d frequencies, best of %d" % (nfreqs, repeats))
+    for net_file in LADDER_FILES:
+        def solve(as_array):
+            Txt_Data = main.DataExtract(net_file, as_array=as_array)
+            terms = Txt_Data.formatted_Term_Values
+            Freq = numpy.linspace(terms['Fstart'], terms['Fend'], nfreqs)
+            components = Txt_Data.formatted_Circ_Values if as_array else main.build_components(Txt_Data.formatted_Circ_Values)
+            return main.Circ(components, Freq, terms['RL'], terms['VT'], terms['RS'], lazy=True).cascade_ABDC_mat
+        t_dicts, old = best_time(lambda: solve(False), repeats)
+        t_array, new = best_time(lambda: solve(True), repeats)
+        print("%-32s dicts %9.4f s  array %9.4f s  speedup %7.1fx  identical=%r"
+              % (net_file, t_dicts, t_array, t_dicts / t_array, numpy.array_equal(old, new)))
+
+
+def bench_kernels(nfreqs, repeats):
+    net_file = LADDER_FILES[-1]
+    print("Impedance kernel benchmark, %s, %d frequencies, best of %d" % (net_file, nfreqs, repeats))
+    Freq = numpy.linspace(1, 1e6, nfreqs)
+    components = [component for component in main.build_components(main.DataExtract(net_file).formatted_Circ_Values) if component.Type in ['L', 'C']]
+    t_loop, old = best_time(lambda: [legacy_Z_GEN(component, Freq) for component in components], repeats)
+    t_kernel, new = best_time(lambda: [component.Z_ARRAY(Freq) for component in components], repeats)
+    same = all(numpy.allclose(list(Z.values()), Z_array, rtol=1e-15, atol=0) for Z, Z_array in zip(old, new))
+    print("%4d L and C  loop %9.4f s  kernel %9.4f s  speedup %7.1fx  allclose=%r"
+          % (len(components), t_loop, t_kernel, t_loop / t_kernel, same))
+
+
+def bench_interning(nfreqs, repeats):
+    print("Impedance interning benchmark, %d frequencies, best of %d" % (nfreqs, repeats))
+    cache = main.IMPEDANCE_CACHE
+    for net_file in LADDER_FILES:
+        circuit = load_circuit(net_file, nfreqs, lazy=True)
+        def stacks():
+            return [ABCD for ABCD in circuit.Component_STACKS()]
+        def cold():
+            cache.clear()
+            return stacks()
+        t_cold, old = best_time(cold, repeats)
+        cache.clear()
+        stacks()
+        t_warm, new = best_time(stacks, repeats)
+        stats = cache.stats()
+        print("%-32s cold %9.4f s  warm %9.4f s  speedup %7.1fx  hits %7d  misses %4d  identical=%r"
+              % (net_file, t_cold, t_warm, t_cold / t_warm, stats['hits'], stats['misses'],
+                 all(numpy.array_equal(a, b) for a, b in zip(old, new))))
+
+
+def bench_plan(repeats):
+    import netlist_plan
+    print("Compiled plan benchmark, best of %d" % (repeats))
+    with tempfile.TemporaryDirectory() as directory:
+        for net_file in LADDER_FILES:
+            copy = shutil.copy(net_file, directory)
+            def parse():
+                Txt_Data = main.DataExtract(copy, as_array=True)
+                table = main.build_components(Txt_Data.formatted_Circ_Values)
+                return table.take(table.Order())
+            def plan():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return main.build_components(netlist_plan.compile_netlist(copy).formatted_Circ_Values)
+            plan()  # compile the plan
+            t_parse, old = best_time(parse, repeats)
+            t_plan, new = best_time(plan, repeats)
+            same = all(numpy.array_equal(getattr(old, name), getattr(new, name)) for name in ['Pin1', 'Pin2', 'Type', 'Value'])
+            print("%-32s parse+sort %9.4f s  plan %9.4f s  speedup %7.1fx  plan %8.1f kB  identical=%r"
+                  % (net_file, t_parse, t_plan, t_parse / t_plan, os.path.getsize(netlist_plan.plan_path(copy)) / 1e3, same))
+
+
+def bench_memory(nfreqs):
+    net_file = LADDER_FILES[-1]
+    print("Memory benchmark, %s, %d frequencies" % (net_file, nfreqs))
+    Circ_Values = main.DataExtract(net_file).formatted_Circ_Values
+    Freq = numpy.linspace(1, 1e6, nfreqs)
+
+    def objects():
+        # What build_components used to make, one object (and Z table) per component
+        components = [main.Impedance(c['n1'], c['n2'], c['value'], c['type']) if c['type'] in ['R', 'G']
+                      else main.FreqDepImpedence(c['n1'], c['n2'], c['value'], c['type'], Freq) for c in Circ_Values]
+        for component in components:
+            if component.Type in ['L', 'C']:
+                component.Z = legacy_Z_GEN(component, Freq)
+        return components
+
+    sizes = []
+    for build in (objects, lambda: main.build_components(Circ_Values)):
+        tracemalloc.start()
+        components = build()
+        sizes.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        del components
+    print("objects %10.1f kB  table %10.1f kB  per component %8.1f B / %6.1f B  ratio %7.1fx"
+          % (sizes[0] / 1e3, sizes[1] / 1e3, sizes[0] / len(Circ_Values), sizes[1] / len(Circ_Values), sizes[0] / sizes[1]))
+
+
+def bench_import(repeats):
+    """ Time importing each of IMPORT_MODULES in a fresh interpreter
+    :param repeats - number of fresh interpreters per module, the fastest is kept
+    :return True if every module is within IMPORT_BUDGET and does not import numpy
+    """
+    print("Import benchmark, best of %d, budget %.3f s" % (repeats, IMPORT_BUDGET))
+    script = ("import sys, time\n"
+              "start = time.perf_counter()\n"
+              "import %s\n"
+              "print(time.perf_counter() - start, 'numpy' in sys.modules)")
+    passed = True
+    for module in IMPORT_MODULES:
+        times = []
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, "-c", script % (module)], capture_output=True, text=True, check=True).stdout.split()
+            times.append(float(output[0]))
+            loads_numpy = output[1] == 'True'
+        ok = min(times) <= IMPORT_BUDGET and not loads_numpy
+        passed = passed and ok
+        print("%-32s import %9.4f s  numpy loaded=%-5r  %s" % (module, min(times), loads_numpy, 'ok' if ok else 'FAIL'))
+    return passed
+
+
+if __name__ == "__main__":
+    Nfreqs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    Edits = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    bench_cascade(Nfreqs, Repeats)
+    bench_periodic(Nfreqs, Repeats)
+    bench_incremental(Nfreqs, Edits)
+    bench_array(Nfreqs, Repeats)
+    bench_kernels(Nfreqs, Repeats)
+    bench_interning(Nfreqs, Repeats)
+    bench_plan(Repeats)
+    bench_memory(Nfreqs)
+    if not bench_import(Repeats):
+        sys.exit(1)
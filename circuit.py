@@ -1,2 +1,1175 @@
 # This module contains the class for the circuit object and its solving methods
 
+import os
+import math
+import hashlib
+import threading
+import collections
+import numpy
+from net_reader import COMPONENT_TYPES
+
+##################################################################################################
+#ComponentTypeException
+##################################################################################################
+
+class ComponentTypeException(Exception):
+    def __init__(self):
+        # Initialize the Exception base class with a custom message
+        super().__init__()
+
+##################################################################################################
+#ComponentSolveException
+##################################################################################################
+
+class ComponentSolveException(Exception):
+    def __init__(self):
+        # A component value the circuit cannot be solved with (see ComponentTable.from_records)
+        super().__init__()
+
+def check_values(Type, Value, shunt):
+    # Raise ComponentSolveException for values the circuit cannot be solved with, Type is the index
+    # in COMPONENT_TYPES, takes arrays (a whole table) or the scalars of one component.
+    # The Impedance objects divide by a G or C of 0 and by the impedance of a shunt R or L of 0,
+    # a value that is not finite cannot be solved either
+    divides_by_zero = (numpy.asarray(Value) == 0) & (numpy.asarray(shunt) | numpy.isin(Type, [COMPONENT_TYPES.index('G'), COMPONENT_TYPES.index('C')]))
+    if divides_by_zero.any() or not numpy.isfinite(Value).all():
+        raise ComponentSolveException()
+
+##################################################################################################
+#Impedance kernels
+##################################################################################################
+
+# omega (1j*2*math.pi*Freq) and the grid key of the last few frequency arrays, keyed by id(Freq)
+# each entry holds Freq itself so its id cannot be reused while the entry is kept
+OMEGA_CACHE = {}
+OMEGA_CACHE_SIZE = 8
+OMEGA_LOCK = threading.Lock()
+
+def SWEEP(Freq):
+    """ omega of every frequency in Freq and a key for the grid, worked out once per sweep
+    every L and C stacked over the same Freq array shares the one omega array,
+    so frequency arrays must not be changed in place once they are in use
+    the key depends only on the frequencies, so separate arrays holding the same grid share it
+    :param Freq - numpy.array(float), anything else is converted and not cached
+    :return (numpy.array(complex) 1j*2*math.pi*Freq, grid key)
+    """
+    if not isinstance(Freq, numpy.ndarray) or Freq.dtype != float:
+        Freq = numpy.asarray(Freq, dtype=float)
+        return 1j*2*math.pi*Freq, (Freq.shape, hashlib.blake2b(Freq.tobytes(), digest_size=16).digest())
+    with OMEGA_LOCK:
+        entry = OMEGA_CACHE.get(id(Freq))
+        if entry is None or entry[0] is not Freq:
+            if len(OMEGA_CACHE) >= OMEGA_CACHE_SIZE:
+                del OMEGA_CACHE[next(iter(OMEGA_CACHE))]
+            grid = (Freq.shape, hashlib.blake2b(Freq.tobytes(), digest_size=16).digest())
+            entry = OMEGA_CACHE[id(Freq)] = (Freq, 1j*2*math.pi*Freq, grid)
+        return entry[1], entry[2]
+
+def OMEGA(Freq):
+    # omega of every frequency in Freq, shared by every component on the sweep (see SWEEP)
+    return SWEEP(Freq)[0]
+
+def Z_KERNEL(Type, Value, omega):
+    # Impedance of components of one Type at every frequency of omega, Value can be
+    # a float or an array that broadcasts against omega, R and G do not depend on omega
+    if Type == "R":
+        return Value
+    if Type == "G":
+        return 1/Value
+    if Type == "L":
+        return omega*Value
+    if Type == "C":
+        return 1/(omega*Value)
+    raise ComponentTypeException()
+
+def ABCD_ENTRY(Type, shunt, Value, omega):
+    # The one entry of the ABCD matrix that is not 0 or 1, B = Z in series and C = 1/Z in shunt
+    # a shunt G is its Value, not 1/(1/Value), so the matricies are the same as they have always been
+    if shunt and Type == "G":
+        return Value
+    Z = Z_KERNEL(Type, Value, omega)
+    return 1/Z if shunt else Z
+
+##################################################################################################
+#ImpedanceCache
+##################################################################################################
+
+class ImpedanceCache:
+
+    """
+    Class with argument atributes max_bytes:int
+    Interns the ABCD entry (Z in series, 1/Z in shunt) of each (Type, Value, shunt) signature on a
+    frequency grid, so identical components share one read only array, within a circuit and across
+    every circuit the process solves on the same grid (grids are matched by their frequencies)
+    the least recently used arrays are dropped once they take more than max_bytes, 0 turns interning off
+    hits counts the components that did not need an entry of their own worked out, misses the entries that were
+
+    :def ENTRY
+
+        Interned entry of one component
+
+        INPUT: Type:string shunt:bool Value:float Freq:numpy.array(float)
+        OUTPUT: numpy.array(Nfreq) complex, read only
+
+    :def ENTRIES
+
+        Entries of many components of one Type and shunt at once,
+        each distinct value is looked up (or worked out) once
+
+        INPUT: Type:string shunt:bool Values:numpy.array(float) Freq:numpy.array(float)
+        OUTPUT: numpy.array(Ncomponents,Nfreq) complex
+
+    :def stats
+
+        Hit and miss counts and the size of the cache
+
+        INPUT: N/A
+        OUTPUT: dict(string,int)
+
+    :def clear
+
+        Drop every entry and reset the counters
+
+        INPUT: N/A
+        OUTPUT: N/A
+
+    """
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, Type, shunt, Values, Freq, components):
+        # Entries of the distinct Values, in the same order, working out the missing ones in one kernel call
+        # components is how many components asked for them, to count the hits
+        omega, grid = SWEEP(Freq)
+        keys = [(grid, Type, Value, shunt) for Value in Values.tolist()]
+        with self.lock:
+            found = [self.entries.get(key) for key in keys]
+            for key, entry in zip(keys, found):
+                if entry is not None:
+                    self.entries.move_to_end(key)
+        missing = [index for index, entry in enumerate(found) if entry is None]
+        if missing:
+            new = numpy.empty((len(missing), len(omega)), dtype=complex)
+            new[...] = ABCD_ENTRY(Type, shunt, Values[missing, None], omega)
+            new.flags.writeable = False
+            for index, entry in zip(missing, new):
+                found[index] = entry
+        with self.lock:
+            self.hits += components - len(missing)
+            self.misses += len(missing)
+            if self.max_bytes > 0:
+                for index in missing:
+                    if keys[index] not in self.entries:
+                        self.entries[keys[index]] = found[index]
+                        self.nbytes += found[index].nbytes
+                while self.nbytes > self.max_bytes:
+                    self.nbytes -= self.entries.popitem(last=False)[1].nbytes
+        return found
+
+    def ENTRY(self, Type, shunt, Value, Freq):
+        return self.lookup(Type, shunt, numpy.array([Value], dtype=float), Freq, 1)[0]
+
+    def ENTRIES(self, Type, shunt, Values, Freq):
+        unique, inverse = numpy.unique(Values, return_inverse=True)
+        return numpy.stack(self.lookup(Type, shunt, unique, Freq, len(Values)))[inverse.ravel()]
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.nbytes}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every circuit in the process
+IMPEDANCE_CACHE = ImpedanceCache()
+
+##################################################################################################
+#Impedance
+##################################################################################################
+
+class Impedance:
+
+    """
+    Class with argument atributes Pin1:int Pin2:int Value:float Type:string
+    Calculates and stores atibutes In_node and ABCD
+    thease atributes are calclated and assigned on initialization
+
+    :def MAT_GEN
+
+        Identifies if the component being represented is in shunt or series
+        uses the generic ABCD matrix to represent individual component
+
+        INPUT: Pin1:int Pin2:int Value:float Type:string Frequency:float
+        OUTPUT: ABCD numpy.array
+
+    :def Z_ARRAY
+
+        Returns the impedence at all frequencies in the argument as a numpy array
+        in the same order as the frequencies
+
+        INPUT: Freq:numpy.array(float) Value:float or numpy.array(Nsamples,1) (optional)
+        OUTPUT: Impedences:numpy.array(complex)
+
+    :def MAT_STACK
+
+        Same as MAT_GEN but for every frequency in Freq at once
+        the matricies are stacked along the first axis
+
+        INPUT: Freq:numpy.array(float) Value:float or numpy.array(Nsamples,1) (optional)
+        OUTPUT: ABCD numpy.array(Nfreq,2,2) or numpy.array(Nsamples,Nfreq,2,2)
+
+    :def get_Signature
+
+        Returns what the ABCD matrix depends on, components with equal
+        signatures have identical matricies
+
+        INPUT: Type:string Value:float Pin1:int Pin2:int
+        OUTPUT: (Type:string, Value:float, shunt:bool)
+
+    :def Node_ID
+
+        Identifies which of n1 and n2 (Pin1 Pin2) is the inout node
+    
+        INPUT: Pin1:int Pin2:int
+        OUTPUT: In_node:int
+
+    """
+
+    #Object Represnetin an anolog component in cascade
+    def __init__(self, Pin1, Pin2, Value, Type):
+        self.Type = Type
+        self.Pin1 = Pin1
+        self.Pin2 = Pin2
+        self.Value = Value
+        self.In_node = self.Node_ID()
+
+    def get_Pin1(self):
+        return self.Pin1
+
+    def get_Pin2(self):
+        return self.Pin2
+
+    def get_Value(self):
+        return self.Value
+
+    def set_Value(self, Value):
+        self.Value = Value
+
+    def get_Signature(self):
+        # Two components with the same signature have the same ABCD matricies
+        return (self.Type, self.Value, self.Pin1 == 0 or self.Pin2 == 0)
+
+    def MAT_GEN(self, F):
+        # Calculate ABCD matrix based on Pin1, Pin2, and Value, the same kernel for every Type
+        shunt = self.Pin1 == 0 or self.Pin2 == 0
+        ABCD = numpy.identity(2, dtype=complex)
+        ABCD[(1, 0) if shunt else (0, 1)] = ABCD_ENTRY(self.Type, shunt, self.Value, 1j*2*math.pi*F)
+        return ABCD
+
+    def Z_ARRAY(self, Freq, Value=None):
+        # Value can be an array of shape (Nsamples,1) giving an (Nsamples,Nfreq) table
+        if Value is None:
+            Value = self.Value
+        Freq = numpy.asarray(Freq, dtype=float)
+        Z = Z_KERNEL(self.Type, Value, OMEGA(Freq))
+        # R and G have the same impedence at every frequency
+        shape = numpy.broadcast_shapes(numpy.shape(Value), Freq.shape)
+        return Z if numpy.shape(Z) == shape else numpy.full(shape, Z, dtype=complex)
+
+    def MAT_STACK(self, Freq, Value=None):
+        # Calculate the ABCD matrix at every frequency in Freq at once
+        # Value can be an array of shape (Nsamples,1) to stack many values as well
+        if Value is None:
+            Value = self.Value
+        Freq = numpy.asarray(Freq, dtype=float)
+        shunt = self.Pin1 == 0 or self.Pin2 == 0
+        shape = numpy.broadcast_shapes(numpy.shape(Value), Freq.shape)
+        ABCD = numpy.zeros(shape + (2, 2), dtype=complex)
+        ABCD[..., 0, 0] = 1
+        ABCD[..., 1, 1] = 1
+        if numpy.ndim(Value) == 0:
+            # Shared with every other component of the same signature on this grid
+            entry = IMPEDANCE_CACHE.ENTRY(self.Type, shunt, Value, Freq)
+        else:
+            entry = ABCD_ENTRY(self.Type, shunt, Value, OMEGA(Freq))
+        if shunt:
+            ABCD[..., 1, 0] = entry
+        else:
+            ABCD[..., 0, 1] = entry
+        return ABCD
+        
+    def Node_ID(self):
+        if self.Type not in ["R", "G"]:
+            raise ComponentTypeException()
+        if min(self.Pin1,self.Pin2) == 0:
+                in_node = max(self.Pin1,self.Pin2)
+        else:
+                in_node = min(self.Pin1,self.Pin2)
+        return in_node
+
+
+##################################################################################################
+#FreqDepImpedence
+##################################################################################################
+
+class FreqDepImpedence(Impedance):
+
+    """
+    Class with argument atributes Pin1:int Pin2:int Value:float Type:string Freq:list:float
+    Calculates and stores atibutes In_node and impedence Z (read only numpy.array in the same order as Freq)
+    MAT_GEN, Z_ARRAY and MAT_STACK are those of Impedance, the impedance kernels
+    take the shared omega of the sweep so nothing is worked out per frequency in Python
+
+    :def Z_GEN
+
+        Returns that impedence at all frequencies in [Freq] as a
+        numpy array in the same order as Freq
+
+        INPUT: Value:float Freq:list:float
+        OUTPUT: Impedences:numpy.array(complex)
+
+    :def Node_ID
+
+        Identifies which of n1 and n2 (Pin1 Pin2) is the inout node
+    
+        INPUT: Pin1:int Pin2:int
+        OUTPUT: In_node:int
+
+    """
+
+    def __init__(self, Pin1, Pin2, Value, Type, Freq):
+        super().__init__(Pin1, Pin2, Value, Type)
+        self.Type = Type
+        self.Freq = Freq
+        self.In_node = self.Node_ID()
+        self.Z = self.Z_GEN()
+
+    def get_Type(self):
+        return self.Type
+
+    def set_Value(self, Value):
+        # The impedence table depends on the value so rebuild it
+        self.Value = Value
+        self.Z = self.Z_GEN()
+
+    def Z_GEN(self):
+        #Impedence (Z) at every frequency in Freq, the read only array shared by
+        #every component with the same Type and Value (see ImpedanceCache)
+        return IMPEDANCE_CACHE.ENTRY(self.Type, False, self.Value, self.Freq)
+    
+    def Node_ID(self):
+        if min(self.Pin1,self.Pin2) == 0:
+                in_node = max(self.Pin1,self.Pin2)
+        else:
+                in_node = min(self.Pin1,self.Pin2)
+        return in_node
+
+
+##################################################################################################
+#ComponentTable
+##################################################################################################
+
+class ComponentTable:
+
+    """
+    Class with argument atributes Pin1:numpy.array(int) Pin2:numpy.array(int) Type:numpy.array(int) Value:numpy.array(float)
+    Every component of a circuit held in parallel arrays (struct of arrays) rather than as one
+    Impedance object per component, Type holds codes into COMPONENT_TYPES and shunt flags
+    the components connected to the common node (0)
+    indexing or iterating the table gives ComponentRow views that can be used like Impedance objects
+    impedances and ABCD matricies are worked out from the arrays when they are asked for,
+    nothing is stored per component, identical components share the entries in IMPEDANCE_CACHE
+
+    :def from_records
+
+        Build the table from the circuit section read by DataExtract
+        raises ComponentSolveException for a value that cannot be solved (a G or C of 0,
+        an R or L of 0 in shunt, or a value that is not finite)
+
+        INPUT: Circ_Values:list(dict) or numpy.array(COMPONENT_FIELDS)
+        OUTPUT: ComponentTable
+
+    :def Order
+
+        The permutation that puts the components in cascade order, by In_node
+        then shunt before series (the order Circ.Order_components uses)
+
+        INPUT: N/A
+        OUTPUT: numpy.array(int)
+
+    :def take
+
+        Table of the components at indicies, in that order
+
+        INPUT: indicies:numpy.array(int)
+        OUTPUT: ComponentTable
+
+    :def get_Signatures
+
+        get_Signature of every component
+
+        INPUT: N/A
+        OUTPUT: list((Type:string, Value:float, shunt:bool))
+
+    :def Z_ARRAY
+
+        Impedance of components start..stop at every frequency in Freq
+
+        INPUT: Freq:numpy.array(float) start:int stop:int
+        OUTPUT: Z:numpy.array(Ncomponents,Nfreq)
+
+    :def MAT_STACK
+
+        ABCD stacks of components start..stop at every frequency in Freq
+
+        INPUT: Freq:numpy.array(float) start:int stop:int
+        OUTPUT: ABCD numpy.array(Ncomponents,Nfreq,2,2)
+
+    """
+
+    __slots__ = ('Pin1', 'Pin2', 'Type', 'Value', 'shunt', 'In_node')
+
+    def __init__(self, Pin1, Pin2, Type, Value):
+        self.Pin1 = numpy.asarray(Pin1, dtype=numpy.int64)
+        self.Pin2 = numpy.asarray(Pin2, dtype=numpy.int64)
+        self.Type = numpy.asarray(Type, dtype=numpy.int8)
+        self.Value = numpy.asarray(Value, dtype=float)
+        self.shunt = (self.Pin1 == 0) | (self.Pin2 == 0)
+        # Same as Impedance.Node_ID for every component at once
+        self.In_node = numpy.where(numpy.minimum(self.Pin1, self.Pin2) == 0, numpy.maximum(self.Pin1, self.Pin2), numpy.minimum(self.Pin1, self.Pin2))
+
+    @classmethod
+    def from_records(cls, Circ_Values):
+        if isinstance(Circ_Values, numpy.ndarray):
+            table = cls(Circ_Values['n1'], Circ_Values['n2'], Circ_Values['type'], Circ_Values['value'])
+        else:
+            if any(component_data['type'] not in COMPONENT_TYPES for component_data in Circ_Values):
+                raise ComponentTypeException()
+            table = cls([component_data['n1'] for component_data in Circ_Values],
+                        [component_data['n2'] for component_data in Circ_Values],
+                        [COMPONENT_TYPES.index(component_data['type']) for component_data in Circ_Values],
+                        [component_data['value'] for component_data in Circ_Values])
+        check_values(table.Type, table.Value, table.shunt)
+        return table
+
+    def __len__(self):
+        return len(self.Value)
+
+    def __getitem__(self, index):
+        return ComponentRow(self, range(len(self))[index])
+
+    def __iter__(self):
+        return (ComponentRow(self, index) for index in range(len(self)))
+
+    def Order(self):
+        # lexsort is stable, like the sorted() used for a list of components
+        return numpy.lexsort((~self.shunt, self.In_node))
+
+    def take(self, indicies):
+        return ComponentTable(self.Pin1[indicies], self.Pin2[indicies], self.Type[indicies], self.Value[indicies])
+
+    def get_Signatures(self):
+        return list(zip([COMPONENT_TYPES[code] for code in self.Type.tolist()], self.Value.tolist(), self.shunt.tolist()))
+
+    def Z_ARRAY(self, Freq, start=0, stop=None):
+        Freq = numpy.asarray(Freq, dtype=float)
+        Type, Value = self.Type[start:stop], self.Value[start:stop]
+        Z = numpy.empty((len(Type), len(Freq)), dtype=complex)
+        for code, name in enumerate(COMPONENT_TYPES):
+            rows = Type == code
+            if rows.any():
+                Z[rows] = IMPEDANCE_CACHE.ENTRIES(name, False, Value[rows], Freq)
+        return Z
+
+    def MAT_STACK(self, Freq, start=0, stop=None):
+        Freq = numpy.asarray(Freq, dtype=float)
+        Type, Value, shunt = self.Type[start:stop], self.Value[start:stop], self.shunt[start:stop]
+        ABCD = numpy.zeros((len(Type), len(Freq), 2, 2), dtype=complex)
+        ABCD[..., 0, 0] = 1
+        ABCD[..., 1, 1] = 1
+        # One lookup for each type in shunt and in series, identical components share one entry
+        for code, name in enumerate(COMPONENT_TYPES):
+            for is_shunt in (False, True):
+                rows = numpy.flatnonzero((Type == code) & (shunt == is_shunt))
+                if len(rows) == 0:
+                    continue
+                entry = IMPEDANCE_CACHE.ENTRIES(name, is_shunt, Value[rows], Freq)
+                if is_shunt:
+                    ABCD[rows, :, 1, 0] = entry
+                else:
+                    ABCD[rows, :, 0, 1] = entry
+        return ABCD
+
+
+class ComponentRow:
+
+    """
+    Class with argument atributes table:ComponentTable index:int
+    View of one component of a ComponentTable with the methods of Impedance and FreqDepImpedence,
+    reads and writes go straight to the table so a row holds no data of its own
+    """
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def Pin1(self):
+        return int(self.table.Pin1[self.index])
+
+    @property
+    def Pin2(self):
+        return int(self.table.Pin2[self.index])
+
+    @property
+    def Type(self):
+        return COMPONENT_TYPES[self.table.Type[self.index]]
+
+    @property
+    def Value(self):
+        return float(self.table.Value[self.index])
+
+    @property
+    def In_node(self):
+        return int(self.table.In_node[self.index])
+
+    @property
+    def shunt(self):
+        return bool(self.table.shunt[self.index])
+
+    def get_Pin1(self):
+        return self.Pin1
+
+    def get_Pin2(self):
+        return self.Pin2
+
+    def get_Type(self):
+        return self.Type
+
+    def get_Value(self):
+        return self.Value
+
+    def set_Value(self, Value):
+        self.table.Value[self.index] = Value
+
+    def get_Signature(self):
+        return (self.Type, self.Value, self.shunt)
+
+    def Node_ID(self):
+        return self.In_node
+
+    # The same impedance kernels as an Impedance object, read through the properties
+    Z_ARRAY = Impedance.Z_ARRAY
+    MAT_GEN = Impedance.MAT_GEN
+    MAT_STACK = Impedance.MAT_STACK
+
+
+##################################################################################################
+#CircResults
+##################################################################################################
+
+class CircResults:
+
+    """
+    Class with argument atributes Freq:numpy.array(float) circuit:Circ
+    Columnar store for everything calculated about a circuit
+    each quantity is a single complex numpy array indexed in the same order as Freq
+    (so Vin[i] is the input voltage at Freq[i]) rather than a dictonary keyed by frequency
+    a quantity is only calculated (by the circuit) the first time it is read,
+    after that the stored array is returned
+
+    :atribute cascade_ABDC_mat
+
+        Cascade ABCD matrix of the whole network at every frequency
+
+        numpy.array(Nfreq,2,2)
+
+    :atribute Zin, Zout, Vin, Iin, Vout, Iout, Pin, Pout, Av, Ai, Ap
+
+        One value per frequency
+
+        numpy.array(Nfreq)
+
+    :def calculated
+
+        Returns the names of the quantities that have been calculated so far
+
+        INPUT: N/A
+        OUTPUT: names:list(string)
+
+    :def invalidate
+
+        Forget every calculated quantity, used when a component value changes
+
+        INPUT: N/A
+        OUTPUT: N/A
+
+    """
+
+    QUANTITIES = ['Zin', 'Zout', 'Vin', 'Iin', 'Vout', 'Iout', 'Pin', 'Pout', 'Av', 'Ai', 'Ap']
+
+    def __init__(self, Freq, circuit=None):
+        self.Freq = numpy.asarray(Freq, dtype=float)
+        self.circuit = circuit
+
+    def __len__(self):
+        return len(self.Freq)
+
+    def __getattr__(self, name):
+        # Only called when the quantity has not been stored yet
+        # so ask the circuit to calculate it (and anything it depends on)
+        circuit = self.__dict__.get('circuit')
+        if circuit is None or name not in circuit.CALCULATORS:
+            raise AttributeError(name)
+        circuit.calculate(name)
+        return self.__dict__[name]
+
+    def calculated(self):
+        return [name for name in ['cascade_ABDC_mat'] + self.QUANTITIES if name in self.__dict__]
+
+    def invalidate(self):
+        # Forget every calculated quantity so it is calculated again when next read
+        for name in self.calculated():
+            del self.__dict__[name]
+
+
+##################################################################################################
+#Circ
+##################################################################################################
+
+class Circ:
+
+    """
+    Class with argument atributes components_list:list(component) Freq:list(float) LoadRes:int Vth:int Rs:int
+    Order the list of components
+    components_list is normally a ComponentTable (see main.build_components), a component array
+    from DataExtract(as_array=True) is turned into one, the matricies are then worked out from
+    its columns a block of components at a time, a list of Impedance objects also still works
+    Calculates casacde netwrok ABCD matrix for the circuit defined by the list of components 
+    uses this matrix and the other arguments to calulate V1:folat V2:float I1:float I2:float
+    Zin:float Zout:float Pin:float Pout:float Ai:float Av:float on init
+    every calculated quantity is stored as a whole array in [results] (see CircResults)
+    and can also be read straight from the circuit e.g. circuit.Vin
+    with lazy=True nothing is calculated on init, each quantity (and only what it
+    depends on) is calculated the first time it is read e.g. by get_Ordered_Outputs
+    so only the outputs asked for in the <OUTPUT> section are ever worked out
+
+    with incremental=True the cascade products before and after every component are kept
+    so that update_component can change one value and re-cascade in O(Nfreq)
+    with periodic=True runs of identical cells (e.g. the sections of a ladder) are cascaded
+    by raising the cell matrix to a power, O(log N) products instead of O(N)
+    with ordered=True components_list is already in cascade order (e.g. from a compiled plan,
+    see netlist_plan.py) so it is used as it is rather than sorted again
+
+    :def Find_periodic_runs
+
+        Scan the ordered components for runs where the same sequence of signatures
+        repeats back to back, irregular parts come back as runs of one component
+
+        INPUT: components_list_Ordored:list(component) max_period:int
+        OUTPUT: runs:list((start:int, period:int, repeats:int))
+
+    :def calculate
+
+        Run the method in CALCULATORS for a quantity and store its results
+
+        INPUT: name:string
+        OUTPUT: N/A
+
+    :def update_component
+
+        Set the value of the component at index in the ordered list and re-cascade
+        as prefix[index-1] @ ABCD[index] @ suffix[index+1], all outputs are then
+        recalculated when they are next read
+        raises ComponentSolveException, leaving the circuit as it was, for a value
+        that cannot be solved (see ComponentTable.from_records)
+
+        INPUT: index:int Value:float
+        OUTPUT: N/A
+
+    :def Order_components
+
+        Returns the ordered componets list by the In_node key
+        and keeps the permutation used in component_order
+
+        INPUT: components_list:list(component) or ComponentTable
+        OUTPUT: components_list_ordered:list(component) or ComponentTable
+
+    :def Component_STACKS
+
+        Yields the ABCD stack (MAT_STACK) of each ordered component from start to stop
+
+        INPUT: start:int stop:int
+        OUTPUT: ABCD numpy.array(Nfreq,2,2) per component
+
+    :def Vin_calc, Iin_calc
+
+        Uses the class argument atributes to calculate the input measurments
+
+        INPUT: Vth:float Rs:float Zin:numpy.array(complex)
+        OUTPUT: numpy.array(complex)
+
+    :def Power_CALC
+
+        Complex power V * conj(I) for whole arrays of voltages and currents
+
+        INPUT: V:numpy.array(complex) I:numpy.array(complex)
+        OUTPUT: P:numpy.array(complex)
+
+    :def Z_GEN   
+
+        Uses the class argument atributes and the calculated cascade matricies
+        to calculate the impedence of the network
+
+        INPUT: LoadRes:int Rs:int Cascade_ABCD_MAT:numpy.array(Nfreq,2,2)
+        OUTPUT: Zin:numpy.array(complex) Zout:numpy.array(complex)
+
+    :def MAT_GEN
+
+        Cascade the component ABCD matricies for every frequency in Freq at once,
+        each component contributes a stack of matricies (one per frequency) and the
+        stacks are multiplied together
+
+        INPUT: Freq:list(float) components_list:list(component) 
+        OUTPUT: Cascade_ABCD_MAT:numpy.array(Nfreq,2,2)
+
+    // Calcuate the rest of the required outputs uing this matrix
+    // each one is a single array expression over every frequency
+
+    :def get_Ordered_Outputs
+
+        Convert calculated atributes to dB if specified in the outputs section of the text file
+        do this by accessing the order argument which is dict(Vlaue type e.g. 'Vin' , measurment e.g. dBV)
+        return a dictoanry where Value types map to the calculated column of values
+        or to dict('Mag','Phase') columns when in dB
+
+        INPUT: [All calculated outputs]
+        OUTPUT: Outputs:dict(string,numpy.array)
+
+    """
+
+    # Method that calculates each quantity and every quantity that method returns
+    CALCULATORS = {
+        'cascade_ABDC_mat': ('MAT_GEN', ['cascade_ABDC_mat']),
+        'Zin': ('Z_GEN', ['Zin', 'Zout']),
+        'Zout': ('Z_GEN', ['Zin', 'Zout']),
+        'Vin': ('Vin_CALC', ['Vin']),
+        'Iin': ('Iin_CALC', ['Iin']),
+        'Vout': ('calculate_VoutIout', ['Vout', 'Iout']),
+        'Iout': ('calculate_VoutIout', ['Vout', 'Iout']),
+        'Pin': ('Pin_CALC', ['Pin']),
+        'Pout': ('Pout_CALC', ['Pout']),
+        'Av': ('Av_CALC', ['Av']),
+        'Ai': ('Ai_CALC', ['Ai']),
+        'Ap': ('Ap_CALC', ['Ap']),
+    }
+
+    def __init__(self, components_list, Freq, LoadRes, Vth, Rs, lazy=False, incremental=False, periodic=False, ordered=False):
+        if isinstance(components_list, numpy.ndarray):
+            components_list = ComponentTable.from_records(components_list)
+        self.components_list = components_list
+        self.Freq = Freq
+        self.LoadRes = LoadRes
+        self.Vth = Vth
+        self.Rs = Rs
+        self.incremental = incremental
+        self.periodic = periodic
+        self.ordered = ordered
+        self.results = CircResults(Freq, self)
+        self.components_list_Ordored = self.Order_components()
+        if not lazy:
+            # Reading each quantity calculates it
+            for name in ['cascade_ABDC_mat'] + CircResults.QUANTITIES:
+                getattr(self.results, name)
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, lets circuit.Vin etc. read from the results
+        if name in CircResults.QUANTITIES or name == 'cascade_ABDC_mat':
+            return getattr(self.__dict__['results'], name)
+        raise AttributeError(name)
+
+    def calculate(self, name):
+        # Run the method for the quantity and store everything it returns
+        # the inputs it reads from self.results are calculated first on demand
+        method, names = self.CALCULATORS[name]
+        values = getattr(self, method)()
+        if len(names) == 1:
+            values = (values,)
+        for quantity, value in zip(names, values):
+            setattr(self.results, quantity, value)
+
+    def Order_components(self):
+        if self.ordered:
+            # update_component then changes components_list itself
+            self.component_order = list(range(len(self.components_list)))
+            return self.components_list
+        if isinstance(self.components_list, ComponentTable):
+            self.component_order = self.components_list.Order()
+            return self.components_list.take(self.component_order)
+        self.component_order = sorted(range(len(self.components_list)), key=lambda i: (self.components_list[i].In_node, not (self.components_list[i].Pin1 == 0 or self.components_list[i].Pin2 == 0)))
+        return [self.components_list[i] for i in self.component_order]
+
+    def Component_STACKS(self, start=0, stop=None):
+        Freq = self.results.Freq
+        components = self.components_list_Ordored
+        if not isinstance(components, ComponentTable):
+            for component in components[start:stop]:
+                yield component.MAT_STACK(Freq)
+            return
+        # Blocks of about a million matrix entries keep the memory used bounded
+        start, stop, _ = slice(start, stop).indices(len(components))
+        block = max(1, (1 << 20) // max(len(Freq), 1))
+        for first in range(start, stop, block):
+            yield from components.MAT_STACK(Freq, first, min(first + block, stop))
+            
+    def Identity_STACK(self):
+        # A stack of identity matricies, one per frequency
+        I = numpy.zeros((len(self.results.Freq), 2, 2), dtype=complex)
+        I[:, 0, 0] = 1
+        I[:, 1, 1] = 1
+        return I
+
+    def MAT_GEN(self):
+        current_MAT = self.Identity_STACK()
+        if self.incremental:
+            # Keep every component matrix and running (prefix) product for update_component
+            # prefix_MATs[k] is the cascade of components 0..k and suffix_MATs[k] of k..N-1
+            # only prefix_MATs[:prefix_valid] and suffix_MATs[suffix_valid:] are up to date
+            self.component_MATs = list(self.Component_STACKS())
+            self.prefix_MATs = []
+            for ABCD in self.component_MATs:
+                current_MAT = current_MAT @ ABCD
+                self.prefix_MATs.append(current_MAT)
+            self.suffix_MATs = [None] * len(self.component_MATs)
+            self.prefix_valid = len(self.component_MATs)
+            self.suffix_valid = len(self.component_MATs)
+            return current_MAT
+        if self.periodic:
+            # Repeated runs of the same cells are raised to a power by squaring
+            # anything that does not repeat is cascaded one component at a time
+            for start, period, repeats in self.Find_periodic_runs():
+                cell = None
+                for ABCD in self.Component_STACKS(start, start + period):
+                    cell = ABCD if cell is None else cell @ ABCD
+                if repeats > 1:
+                    cell = numpy.linalg.matrix_power(cell, repeats)
+                current_MAT = current_MAT @ cell
+            return current_MAT
+        # One batched matrix product per component covers every frequency
+        for ABCD in self.Component_STACKS():
+            current_MAT = current_MAT @ ABCD
+        return current_MAT
+
+    def Find_periodic_runs(self, max_period=16):
+        # Split the ordered components into (start, period, repeats) runs
+        # at each position pick the period that repeats over the most components
+        # a component that is not part of any repeat becomes a run of (i, 1, 1)
+        components = self.components_list_Ordored
+        if isinstance(components, ComponentTable):
+            signatures = components.get_Signatures()
+        else:
+            signatures = [component.get_Signature() for component in components]
+        N = len(signatures)
+        runs = []
+        i = 0
+        while i < N:
+            best_period, best_repeats = 1, 1
+            for period in range(1, min(max_period, (N - i) // 2) + 1):
+                cell = signatures[i:i + period]
+                repeats = 1
+                while signatures[i + repeats * period:i + (repeats + 1) * period] == cell:
+                    repeats += 1
+                if repeats > 1 and period * repeats > best_period * best_repeats:
+                    best_period, best_repeats = period, repeats
+            runs.append((i, best_period, best_repeats))
+            i += best_period * best_repeats
+        return runs
+
+    def update_component(self, index, Value):
+        # Change the value of one component and re-cascade using the stored products
+        # either side of it, the outputs are recalculated when they are next read
+        if not self.incremental:
+            raise ValueError("update_component needs a circuit created with incremental=True")
+        self.results.cascade_ABDC_mat  # make sure the prefix products exist
+        N = len(self.component_MATs)
+        index = range(N)[index]
+        component = self.components_list_Ordored[index]
+        Type, _, shunt = component.get_Signature()
+        check_values(COMPONENT_TYPES.index(Type), Value, shunt)
+        component.set_Value(Value)
+        self.component_MATs[index] = next(self.Component_STACKS(index, index + 1))
+
+        # Bring the products just before and after index up to date, this is free
+        # when the same component is edited again and again
+        while self.prefix_valid < index:
+            j = self.prefix_valid
+            before = self.prefix_MATs[j - 1] if j > 0 else self.Identity_STACK()
+            self.prefix_MATs[j] = before @ self.component_MATs[j]
+            self.prefix_valid += 1
+        while self.suffix_valid > index + 1:
+            j = self.suffix_valid - 1
+            after = self.suffix_MATs[j + 1] if j + 1 < N else self.Identity_STACK()
+            self.suffix_MATs[j] = self.component_MATs[j] @ after
+            self.suffix_valid -= 1
+
+        cascade = self.component_MATs[index]
+        if index > 0:
+            cascade = self.prefix_MATs[index - 1] @ cascade
+        if index + 1 < N:
+            cascade = cascade @ self.suffix_MATs[index + 1]
+        # Products that include the changed component are now out of date
+        self.prefix_valid = min(self.prefix_valid, index)
+        self.suffix_valid = max(self.suffix_valid, index + 1)
+
+        self.results.invalidate()
+        self.results.cascade_ABDC_mat = cascade
+    
+    def Vin_CALC(self):
+        Zin = self.results.Zin
+        return self.Vth * (Zin/(Zin + self.Rs))
+    
+    def Iin_CALC(self):
+        return self.results.Vin/self.results.Zin
+    
+    def Pin_CALC(self):
+        return self.Power_CALC(self.results.Vin, self.results.Iin)
+    
+    def Pout_CALC(self):
+        return self.Power_CALC(self.results.Vout, self.results.Iout)
+
+    def Power_CALC(self, V, I):
+        # V * conj(I) written out in real and imaginary parts
+        # numpy's complex array multiply may fuse the multiply-add which changes
+        # the last bit (e.g. a purely real power gets a ~1e-25 imaginary part)
+        P = numpy.empty(numpy.shape(V), dtype=complex)
+        P.real = V.real * I.real + V.imag * I.imag
+        P.imag = V.imag * I.real - V.real * I.imag
+        return P
+    
+    def Av_CALC(self):
+        MAT = self.results.cascade_ABDC_mat
+        A, B = MAT[..., 0, 0], MAT[..., 0, 1]
+        Z_L = self.LoadRes
+        return 1 / (A + B / Z_L)
+
+    def Ai_CALC(self):
+        return self.results.Iout/self.results.Iin
+    
+    def Ap_CALC(self):
+        return self.results.Pout/self.results.Pin
+
+    
+    def Z_GEN(self):
+        MAT = self.results.cascade_ABDC_mat
+        A, B, C, D = MAT[..., 0, 0], MAT[..., 0, 1], MAT[..., 1, 0], MAT[..., 1, 1]
+        Z_L = self.LoadRes
+        Z_S = self.Rs
+        Zin = (A * Z_L + B) / (C * Z_L + D)
+        Zout = (D * Z_S + B) / (C * Z_S + A)
+        return Zin, Zout
+    
+    def calculate_VoutIout(self):
+        MAT = self.results.cascade_ABDC_mat
+        A, B = MAT[..., 0, 0], MAT[..., 0, 1]
+        V1 = self.results.Vin
+        #det = numpy.complex128(A * D - B * C)
+        #Vout =  numpy.complex128((D * V1 - B * I1) / det)
+        Iout = V1/(A*self.LoadRes+B)
+        Vout = self.LoadRes * Iout
+        return Vout, Iout
+    
+    def get_Ordered_Outputs(self, order):
+        Outputs = {}
+
+        for param, unit in order.items():
+            parts = param.split(" ")
+            param_raw = parts[0]
+            value = getattr(self.results, param_raw, None)
+            if value is None:
+                continue  # Skip if attribute does not exist
+            if 'dB' in unit:
+                # Define dB_multiplier based on the presence of specific keywords in param
+                if any(keyword in param for keyword in ['Pout', 'Pin', 'Zin', 'Zout', 'Ap']):
+                    dB_multiplier = 10
+                else:
+                    dB_multiplier = 20
+                # log10(0) is -inf which is what a zero magnitude should show
+                with numpy.errstate(divide='ignore'):
+                    mag_dB = dB_multiplier * numpy.log10(numpy.abs(value))
+                phase_rad = numpy.angle(value)  # Keep phase in radians
+                Outputs[param] = {'Mag': mag_dB, 'Phase': phase_rad}
+            else:
+                Outputs[param] = value
+
+        return Outputs
+
+
+##################################################################################################
+#MonteCarloCirc
+##################################################################################################
+
+class MonteCarloCirc(Circ):
+
+    """
+    Class with argument atributes components_list:list(component) Freq:list(float) LoadRes:int Vth:int Rs:int
+    Nsamples:int tolerances:dict seed:int
+    A Circ where each component value is drawn Nsamples times within its tolerance
+    the cascade gains a leading batch axis so every sample is solved at once
+    (numpy.array(Nsamples,Nfreq,2,2)) and all of the Circ output formulas are reused,
+    so circuit.Vin etc. are numpy.array(Nsamples,Nfreq)
+
+    tolerances maps either the index of a component in components_list or a component
+    type ('R','G','L','C') to (tolerance:float, distribution:string), the index takes priority
+    e.g. {'R': (0.05, 'uniform'), 3: (0.01, 'normal')}
+    'uniform' draws the value from Value*(1 +- tolerance)
+    'normal' draws from a normal distribution about Value with 3 sigma = tolerance*Value
+    components without a tolerance keep their nominal value
+
+    :def Sample_values
+
+        Draw the Nsamples values of one component
+
+        INPUT: index:int component:component
+        OUTPUT: Values:numpy.array(Nsamples)
+
+    :def get_Percentile_Bands
+
+        Take the percentiles over the samples of every output in order
+        (real and imaginary parts, or magnitude and phase in dB, separately)
+        the phase percentiles are taken of the deviations from the circular mean of the
+        samples and added back to it, so a band can go a little past +-pi rather than
+        jump to the other side
+
+        INPUT: order:dict(string,string) percentiles:list(float)
+        OUTPUT: bands:list(MonteCarloBand)
+
+    :def Phase_deviations
+
+        Circular mean of the sampled phases and the deviation of each sample from it
+
+        INPUT: Phase:numpy.array(Nsamples,Nfreq)
+        OUTPUT: (centre:numpy.array(Nfreq), deviation:numpy.array(Nsamples,Nfreq))
+
+    """
+
+    # main.MONTE_CARLO_DISTRIBUTIONS repeats these for the command line
+    DISTRIBUTIONS = ['uniform', 'normal']
+
+    def __init__(self, components_list, Freq, LoadRes, Vth, Rs, Nsamples, tolerances, seed=None, lazy=False):
+        self.Nsamples = Nsamples
+        self.tolerances = tolerances
+        self.rng = numpy.random.default_rng(seed)
+        self.sampled_Values = [self.Sample_values(i, component) for i, component in enumerate(components_list)]
+        super().__init__(components_list, Freq, LoadRes, Vth, Rs, lazy=lazy)
+
+    def Sample_values(self, index, component):
+        spec = self.tolerances.get(index, self.tolerances.get(component.Type))
+        if spec is None:
+            return numpy.full(self.Nsamples, component.Value, dtype=float)
+        tolerance, distribution = spec
+        if distribution == 'uniform':
+            spread = self.rng.uniform(-tolerance, tolerance, self.Nsamples)
+        elif distribution == 'normal':
+            spread = self.rng.normal(0, tolerance/3, self.Nsamples)
+        else:
+            raise ValueError(f"Distribution '{distribution}' is not one of {self.DISTRIBUTIONS}")
+        return component.Value * (1 + spread)
+
+    def Identity_STACK(self):
+        # One identity matrix per sample per frequency
+        I = numpy.zeros((self.Nsamples, len(self.results.Freq), 2, 2), dtype=complex)
+        I[..., 0, 0] = 1
+        I[..., 1, 1] = 1
+        return I
+
+    def MAT_GEN(self):
+        # Same as Circ.MAT_GEN but each component stack carries every sampled value
+        Freq = self.results.Freq
+        current_MAT = self.Identity_STACK()
+        for index in self.component_order:
+            component = self.components_list[index]
+            current_MAT = current_MAT @ component.MAT_STACK(Freq, self.sampled_Values[index][:, None])
+        return current_MAT
+
+    @staticmethod
+    def Phase_deviations(Phase):
+        # The circular mean of the sampled phases at each frequency and every sample's deviation
+        # from it in (-pi, pi], so samples either side of +-pi are next to each other
+        centre = numpy.angle(numpy.exp(1j * Phase).mean(axis=0))
+        return centre, numpy.angle(numpy.exp(1j * (Phase - centre)))
+
+    def get_Percentile_Bands(self, order, percentiles=(5, 50, 95)):
+        outputs = self.get_Ordered_Outputs(order)
+        phases = {param: self.Phase_deviations(column['Phase']) for param, column in outputs.items() if isinstance(column, dict)}
+        bands = []
+        for q in percentiles:
+            band = {}
+            for param, column in outputs.items():
+                if isinstance(column, dict):
+                    centre, deviation = phases[param]
+                    band[param] = {'Mag': numpy.percentile(column['Mag'], q, axis=0),
+                                   'Phase': centre + numpy.percentile(deviation, q, axis=0)}
+                else:
+                    value = numpy.empty(column.shape[1:], dtype=complex)
+                    value.real = numpy.percentile(column.real, q, axis=0)
+                    value.imag = numpy.percentile(column.imag, q, axis=0)
+                    band[param] = value
+            bands.append(MonteCarloBand(self.results.Freq, q, band))
+        return bands
+
+
+##################################################################################################
+#MonteCarloBand
+##################################################################################################
+
+class MonteCarloBand:
+
+    """
+    Class with argument atributes Freq:numpy.array(float) q:float outputs:dict(string,numpy.array)
+    One percentile of the outputs of a MonteCarloCirc, looks enough like a Circ
+    (results.Freq and get_Ordered_Outputs) to be written by CircResultsExporter
+
+    :def file_name
+
+        Insert the percentile into an output file name e.g. out.csv => out_p95.csv
+
+        INPUT: file_path:string
+        OUTPUT: file_path:string
+
+    """
+
+    def __init__(self, Freq, q, outputs):
+        self.results = CircResults(Freq)
+        self.q = q
+        self.outputs = outputs
+
+    def get_Ordered_Outputs(self, order):
+        return {param: self.outputs[param] for param in order if param in self.outputs}
+
+    def file_name(self, file_path):
+        """
+        >>> MonteCarloBand([], 95, {}).file_name('out.csv')
+        'out_p95.csv'
+        >>> MonteCarloBand([], 2.5, {}).file_name('User_files/b_RC.csv')
+        'User_files/b_RC_p2.5.csv'
+        """
+        root, ext = os.path.splitext(file_path)
+        return f"{root}_p{self.q:g}{ext}"
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -18,6 +18,8 @@
 #   Authors:        Joshua O Poole
 ##############################################################################################################################################
 
+import numpy
+
 
 class CircResultsExporter:
 
@@ -32,6 +34,29 @@ class CircResultsExporter:
         INPUT: x:float
         OUTPUT: x:string
 
+    :def header_rows
+
+        Format the two header rows as lists of padded strings
+
+        INPUT: ordered_parameters:dict(string,string)
+        OUTPUT: To2Darray:list(list(string))
+
+    :def data_columns
+
+        Table of every value to be written, one row per frequency and two columns
+        per output (Re/Im or dB magnitude/phase) scaled by the unit prefix
+
+        INPUT: circuit:circuit
+        OUTPUT: values:numpy.array(Nfreq,1+2*Noutputs)
+
+    :def format_rows
+
+        Format a whole table of values into the padded, comma separated text of the rows
+        in bulk rather than one value at a time
+
+        INPUT: values:numpy.array
+        OUTPUT: text:string
+
     :def export_to_csv
 
         Colate all of the circuit information and format
@@ -40,6 +65,14 @@ class CircResultsExporter:
         INPUT: File_path:string circuit_instance:circuit
         OUTPUT: N/A
 
+    :def stream_to_csv
+
+        Same as export_to_csv for a sweep split into consecutive chunks,
+        one circuit per chunk, each written out before the next is solved
+
+        INPUT: File_path:string circuits:iterable(circuit)
+        OUTPUT: N/A
+
     """
 
     def __init__(self, circuit_instance, ordered_parameters):
@@ -87,10 +120,7 @@ class CircResultsExporter:
         """
         return ' ' * (total_length - len(text)) + text 
 
-    def export_to_csv(self, file_path):
-        # get the ordered outputs from circuit
-        ordered_data = self.circuit.get_Ordered_Outputs(self.ordered_parameters)
-        
+    def header_rows(self):
         # Initialize headers and units with padding
         header_row = [self.pad_left_to_comma('Freq')]
         unit_row = [self.pad_left_to_comma('Hz')]
@@ -120,61 +150,102 @@ class CircResultsExporter:
         header_row = [self.pad_left_to_comma(text) + ',' if i < len(header_row) - 1 else self.pad_left_to_comma(text) for i, text in enumerate(header_row)]
         unit_row = [self.pad_left_to_comma(text) + ',' if i < len(unit_row) - 1 else self.pad_left_to_comma(text) for i, text in enumerate(unit_row)]
 
+        return [header_row, unit_row]
 
-        # Initialize 2D array with header and unit rows
-        # This will be populated with the circuit simulation results
-        To2Darray = [header_row, unit_row]
+    def prefix_scale(self, unit):
+        """
+        The divisor for a power of 10 prefix at the start of the unit, 1 when there is none
 
-        # Populate the 2D array with data for each frequency
-        # Pad and format each entry to a 4sf standard form string
-        # Do dB conversion if needed
+        >>> exporter = CircResultsExporter(None, None)
+        >>> exporter.prefix_scale('mV')
+        0.001
+        >>> exporter.prefix_scale('kdBW')
+        1000.0
+        >>> exporter.prefix_scale('dBmV')
+        1.0
+        """
+        for key in self.conversionDict.keys():
+            if unit.startswith(key):
+                return float('1'+self.conversionDict[key])
+        return 1.0
 
-        # Iterate through each frequency 
-        for F in self.circuit.Freq:
-            # Intilialize the row and add the padded and fromatted frequecny to it
-            row = [self.pad_left_to_comma(self.format_number(F))]
-            # Iterate through each ordered paeramiters value at the frequecny F
-            for param, unit in self.ordered_parameters.items():
-                # Retrive the value from the circuit class instance
-                data_point = ordered_data[F][param]
-                # handel dB converstion, pad, format and add values to the row
-                if 'dB' in unit:
-                    dB_removed = unit.replace("dB", "")
-                    # In case where dB in unit check for power of 10 prefix in unit
-                    if any(unit.startswith(key) for key in self.conversionDict):
-                        for key in self.conversionDict.keys():
-                            if dB_removed.startswith(key):
-                                row.extend([self.pad_left_to_comma(self.format_number(data_point['Mag']/float('1'+self.conversionDict[key]))), 
-        # Store Mag scaled by prefix and phase
-                                                self.pad_left_to_comma(self.format_number(data_point['Phase']))])
-                    else:
-                        row.extend([self.pad_left_to_comma(self.format_number(data_point['Mag'])), 
-                                    self.pad_left_to_comma(self.format_number(data_point['Phase']))])
-                else:
-                    if any(unit.startswith(key) for key in self.conversionDict):
-                    # Iterate through possable prefixes to find the match
-                        for key in self.conversionDict.keys():
-                            if unit.startswith(key):
-                                    # Store Real and Imaginary parts scaled by prefix
-                                    row.extend([self.pad_left_to_comma(self.format_number(data_point.real/float('1'+self.conversionDict[key]))), 
-                                                self.pad_left_to_comma(self.format_number(data_point.imag/float('1'+self.conversionDict[key])))])
-                    else:
-                                row.extend([self.pad_left_to_comma(self.format_number(data_point.real)), 
-                                            self.pad_left_to_comma(self.format_number(data_point.imag))])
-                    
-            
-            # Append commas at the end of each data entry, including for the last one
-            row_with_commas = [f"{entry}," for entry in row]
-            # Append each row the the To2Darray list
-            To2Darray.append(row_with_commas)
-
-        # Write the formatted 2D array to a CSV file manually
-        with open(file_path, 'w', newline='') as Output_file:
-            for row in To2Darray:
-                # Combine all the entries in a row into a single string
-                line = ' '.join(row)
-                # Write the line to the file and add a newline
-                Output_file.write(line + '\n')  
+    def data_columns(self, circuit):
+        # get the ordered outputs from circuit
+        ordered_data = circuit.get_Ordered_Outputs(self.ordered_parameters)
+        results = circuit.results
+
+        # One row per frequency and one column per entry of the output table
+        # prefix scaling and dB conversion are applied to whole columns at once
+        values = numpy.empty((len(results.Freq), 1 + 2*len(self.ordered_parameters)))
+        values[:, 0] = results.Freq
+        for i, (param, unit) in enumerate(self.ordered_parameters.items()):
+            column = ordered_data[param]
+            scale = self.prefix_scale(unit)
+            if 'dB' in unit:
+                # Store Mag scaled by prefix and phase
+                values[:, 2*i + 1] = column['Mag']/scale
+                values[:, 2*i + 2] = column['Phase']
+            else:
+                # Store Real and Imaginary parts scaled by prefix
+                values[:, 2*i + 1] = column.real/scale
+                values[:, 2*i + 2] = column.imag/scale
+        return values
+
+    def format_rows(self, values):
+        # Format a whole table of values into the text of its rows
+        # a finite value always formats to at least 10 characters (sign then %.3e)
+        # so no padding is needed and a block of finite rows is formatted by one % operation
+        # rows holding inf or nan (e.g. the dB of 0) are formatted value by value
+        nrows, ncols = values.shape
+        row_format = ' '.join(['%s%.3e,'] * ncols) + '\n'
+        finite = numpy.isfinite(values).all(axis=1)
+        edges = [0] + (numpy.flatnonzero(finite[1:] != finite[:-1]) + 1).tolist() + [nrows]
+        text = []
+        for first, last in zip(edges[:-1], edges[1:]):
+            if first == last:
+                continue
+            block = values[first:last]
+            if finite[first]:
+                cells = numpy.empty(block.shape + (2,), dtype=object)
+                cells[..., 0] = numpy.where(block < 0, '-', ' ')
+                cells[..., 1] = numpy.abs(block)
+                text.append((row_format * len(block)) % tuple(cells.ravel().tolist()))
+            else:
+                for row in block:
+                    # Append commas at the end of each data entry, including for the last one
+                    text.append(' '.join(self.pad_left_to_comma(self.format_number(value)) + ',' for value in row) + '\n')
+        return ''.join(text)
+
+    def header_text(self):
+        # Combine all the entries in a row into a single string
+        return ''.join(' '.join(row) + '\n' for row in self.header_rows())
+
+    def export_to_csv(self, file_path):
+        self.stream_to_csv(file_path, [self.circuit])
+
+    def chunk_texts(self, circuits):
+        # Each circuit covers the next chunk of the sweep and is only solved when it is reached,
+        # the text of its rows is produced before the next one is solved so one chunk is held at a time
+        # the header goes out with the first chunk
+        circuits = iter(circuits)
+        first = next(circuits, None)
+        yield self.header_text() + (self.format_rows(self.data_columns(first)) if first is not None else '')
+        for circuit in circuits:
+            yield self.format_rows(self.data_columns(circuit))
+
+    def csv_text(self, circuits):
+        # The whole csv file as a string, for callers that do not want a file on disk
+        return ''.join(self.chunk_texts(circuits))
+
+    def stream_to_csv(self, file_path, circuits):
+        # the first chunk is solved before the file is opened so a failure leaves no file behind
+        texts = self.chunk_texts(circuits)
+        text = next(texts)
+        # Write the formatted text to a CSV file manually, one large write per chunk
+        with open(file_path, 'w', newline='', buffering=1 << 20) as Output_file:
+            Output_file.write(text)
+            for text in texts:
+                Output_file.write(text)
 
         print(f'CSV file has been saved to {file_path}')
 
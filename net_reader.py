@@ -1,5 +1,20 @@
+# This module reads a .net file and breaks it down into its circuit, terms and output sections
 
+import os
 import re
+import mmap
+import locale
+import operator
+
+# Component types in the order of their codes in a component array
+COMPONENT_TYPES = ['R', 'G', 'L', 'C']
+# Fields of a component array, see DataExtract as_array
+COMPONENT_FIELDS = [('n1', 'i8'), ('n2', 'i8'), ('type', 'i1'), ('value', 'f8')]
+
+
+class ComponentValueException(Exception):
+    pass
+
 
 class DataExtract:
 
@@ -11,16 +26,30 @@ class DataExtract:
 
     :def read_file
 
-        Open and store [file_name] and [content]
-        romve comments and break up [content]
-        format content so that each line is an elemnt in a list
-        process each section, stroing the resukts in apropriate data structures
+        Open [file_name] and pass its lines to parse_lines one at a time
 
-        INPUT: file_name string
+        INPUT: file_name string, optional content string (netlist text, the file is then not read)
+               as_array bool (optional)
         OUTPUT: formatted_circuit:list(dict(string,float))
                 formatted_terms:dict(string,float)
                 formatted_output:dict(string,string)
 
+        with as_array=True formatted_circuit is a numpy structured array (COMPONENT_FIELDS:
+        n1, n2, type code into COMPONENT_TYPES, value) whenever every component line is a plain
+        'n1=.. n2=.. T=value' line of a known type, otherwise (and for every error) it is exactly
+        what it would be without as_array
+
+    :def parse_lines
+
+        Single pass over the lines of the netlist
+        comment lines are skipped, each section is cut out of the remaining lines and
+        circuit lines are turned into component records as soon as they are reached
+        the results are the same as removing the comments, splitting the whole text on the
+        delimiters and processing each section in turn
+
+        INPUT: lines iterable:string
+        OUTPUT: formatted_circuit, formatted_terms, formatted_output as for read_file
+
     :def remove_comments
 
         Take the argument string, iterate trough it and remove lines begining with #
@@ -37,20 +66,28 @@ class DataExtract:
         INPUT: [circuit,terms,outupt]_section string
         OUTPUT: [circuit,terms,outupt]_data list:string
 
-    :def node_helper
+    :def component_columns
 
-        Store the data found in the regEx matches identified as nodes
+        Fast path for as_array, split one plain circuit line into its fields
 
-        INPUT: matches list:string
-        OUTPUT: node_dict:Dict
+        INPUT: component string, rows list
+        OUTPUT: bool (False if the line is not plain)
 
-    :def value_helper
+    :def component_array
 
-        Store the data found in the regEx matches identified as type=value
-        with added support for prefixes
+        Convert the fields of every plain line into a component array, whole columns at a time
 
-        INPUT: matches list:string
-        OUTPUT: val_dict:Dict
+        INPUT: rows list((string,string,string,string,string))
+        OUTPUT: numpy.array(COMPONENT_FIELDS) or None
+
+    :def component_record
+
+        Match one circuit line against the precompiled line pattern and store its
+        nodes, type and value, with added support for prefixes
+        returns None if the line is not in a supported format
+
+        INPUT: component string
+        OUTPUT: record:Dict
     
     :def process_[circuit,terms,outupt]_section
 
@@ -62,8 +99,28 @@ class DataExtract:
 
     """
 
-    def __init__(self, file_name):
+    SECTIONS = ['CIRCUIT', 'TERMS', 'OUTPUT']
+    # With as_array the fields of this many circuit lines are held as text before they are
+    # converted into a block of the component array
+    ROW_BLOCK = 1 << 14
+    # Pages of a mapped file that have been read are let go every MAPPED_RELEASE bytes
+    MAPPED_RELEASE = 1 << 24
+    # The components are in netlist order, Circ sorts them (a compiled plan holds them sorted already)
+    components_ordered = False
+    # One match per component line: nodes, type, number, the space before the prefix and the prefix
+    # only one split of a line can match (the type=value part holds at most two spaces), so the
+    # greedy (.*) finds the same split as a lazy (.*?) but starts looking from the end of the line
+    LINE_PATTERN = re.compile(r'^(.*)\s(\w+)=(?:(\d+(?:\.\d+)?(?:e[+-]?\d+)?)|[a-zA-Z]+)(\s?)([numkMG]?)$')
+    NODE_PATTERN = re.compile(r'(\w+)=(\S+)')
+    PLAIN_NODES_PATTERN = re.compile(r'\s*n1=(\d+)\s+n2=(\d+)\s*')
+    TERMS_PATTERN = re.compile(r'(\b\w+\b)=(\S+)')
+    OUTPUT_PATTERN = re.compile(r'(\w+)\s*(\w+)?')
+
+    def __init__(self, file_name, content=None, as_array=False):
+        # content is the text of the netlist when it is already in memory,
+        # file_name is then only used as a label and nothing is read from disk
         self.file_name = file_name
+        self.as_array = as_array
         self.conversionDict = {
             'p': 'e-12',
             'n': 'e-9',
@@ -73,36 +130,112 @@ class DataExtract:
             'M': 'e6',
             'G': 'e9'
         }
-        self.read_file()
+        if content is None:
+            self.read_file()
+        else:
+            self.parse_content(content)
 
     def read_file(self):
-        with open(self.file_name, 'r') as file:
-            content = file.read()
-            # content is the raw text contained in the input file
-        Real_Content = self.remove_comments(content)
-        # Remove lines that begin with '#'
+        # The file is memory mapped and read one line at a time, only the terms and output sections
+        # are kept as text, nothing before the line holding the first section tag is read at all
+        with open(self.file_name, 'rb') as file:
+            # An empty file cannot be mapped, it holds no sections either
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else None
         try:
-            circuit_section = Real_Content.split('<CIRCUIT>')[1].split('</CIRCUIT>')[0]
-            terms_section = Real_Content.split('<TERMS>')[1].split('</TERMS>')[0]
-            output_section = Real_Content.split('<OUTPUT>')[1].split('</OUTPUT>')[0]
-            # Split the content by sections
-        except IndexError:
+            if not self.parse_lines(self.mapped_lines(mapped), self.as_array):
+                # The circuit does not fit in a component array, read it again as a list of dicts
+                self.parse_lines(self.mapped_lines(mapped), False)
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+    def mapped_lines(self, mapped):
+        # Lines of the mapped file from the start of the line holding the first opening tag (on a
+        # comment line or not, parse_lines skips comment lines), decoded as open() would decode them
+        # the lines before it cannot open a section so they make no difference to the result
+        if mapped is None:
+            return
+        tags = [mapped.find(('<%s>' % name).encode(), 0) for name in self.SECTIONS]
+        tags = [tag for tag in tags if tag >= 0]
+        if not tags:
+            return
+        mapped.seek(mapped.rfind(b'\n', 0, min(tags)) + 1)
+        encoding = locale.getpreferredencoding(False)
+        released = 0
+        for line in iter(mapped.readline, b''):
+            yield line.decode(encoding)
+            if mapped.tell() - released >= self.MAPPED_RELEASE and hasattr(mapped, 'madvise'):
+                # The pages stay in the page cache, they just stop counting towards this process
+                end = mapped.tell() // mmap.PAGESIZE * mmap.PAGESIZE
+                mapped.madvise(mmap.MADV_DONTNEED, released, end - released)
+                released = end
+
+    def parse_content(self, content):
+        lines = content.splitlines(keepends=True)
+        if not self.parse_lines(lines, self.as_array):
+            self.parse_lines(lines, False)
+
+    def parse_lines(self, lines, as_array=False):
+        # Returns False (having stored nothing) if as_array is set and the circuit
+        # cannot be held in a component array
+        # state of each section, None before its delimiter, True inside it and False after it
+        inside = dict.fromkeys(self.SECTIONS, None)
+        pieces = {'TERMS': [], 'OUTPUT': []}
+        circuit = self.CircuitBuilder(self, as_array)
+        ended = False
+        for file_line in lines:
+            # splitlines breaks lines exactly where the whole text would be broken
+            for line in file_line.splitlines():
+                # Skip lines that begin with '#', delimiters on them are ignored too
+                if line.lstrip().startswith('#'):
+                    continue
+                if '<' not in line:
+                    # No delimiter on the line, it belongs whole to the sections that are open
+                    if inside['CIRCUIT']:
+                        circuit.add(line)
+                        if circuit.irregular:
+                            return False
+                    if inside['TERMS']:
+                        pieces['TERMS'].append(line)
+                    if inside['OUTPUT']:
+                        pieces['OUTPUT'].append(line)
+                    continue
+                for name in self.SECTIONS:
+                    piece = self.section_piece(name, line, inside)
+                    if piece is None:
+                        continue
+                    if name == 'CIRCUIT':
+                        circuit.add(piece)
+                        if circuit.irregular:
+                            return False
+                    else:
+                        pieces[name].append(piece)
+                if set(inside.values()) == {False}:
+                    # Every section has ended, the rest of the file makes no difference
+                    ended = True
+                    break
+            if ended:
+                break
+        if None in inside.values():
             # This will occur when a delimiter is missing
             # The spec and model files mean that the program must not terminate but an empty file must be exported
             # hence the assignation of sections with empty lists
             print("Missing required input information (Some delimiting text was not found)")
-            circuit_section = []
-            terms_section = []
-            output_section = []
+            circuit.failed = True
+            circuit.message = None
+        else:
+            circuit.finish()
+            if circuit.irregular:
+                return False
+        if circuit.message is not None:
+            print(circuit.message)
         try:
-            # Get each section into the form of a list where each line is stored at an index
-            circuit_data = self.parse_section(circuit_section)
-            terms_data = self.parse_section(terms_section)
-            output_data = self.parse_section(output_section)
-            # Process each section using regEx and strore golablly in dic for acces outside of class object
-            self.formatted_Circ_Values = self.process_circuit_data(circuit_data)
-            self.formatted_Term_Values = self.process_terms_data(terms_data)
-            self.formatted_Outputs = self.process_output_data(output_data)
+            if circuit.failed:
+                raise ValueError
+            self.formatted_Circ_Values = circuit.records
+            # Get the other sections into the form of a list where each line is stored at an index
+            self.formatted_Term_Values = self.process_terms_data(self.parse_section('\n'.join(pieces['TERMS'])))
+            self.formatted_Outputs = self.process_output_data(self.parse_section('\n'.join(pieces['OUTPUT'])))
         except Exception:
             # This will occur when any contense within the sections cannot be processed as intended
             # E.g. there is a string ('BREXIT') where a float (3.18e-9) should be
@@ -111,6 +244,121 @@ class DataExtract:
             self.formatted_Circ_Values = [{}]
             self.formatted_Term_Values = {}
             self.formatted_Outputs = {}
+        return True
+
+    def section_piece(self, name, line, inside):
+        # The part of line that is in section name, None if there is none
+        # a section runs from its first <name> to the next </name> (or <name>), as text.split would cut it
+        if inside[name] is None:
+            start = line.find('<%s>' % name)
+            if start < 0:
+                return None
+            inside[name] = True
+            line = line[start + len(name) + 2:]
+        elif inside[name] is False:
+            return None
+        ends = [end for end in (line.find('</%s>' % name), line.find('<%s>' % name)) if end >= 0]
+        if ends:
+            inside[name] = False
+            return line[:min(ends)]
+        return line
+
+    class CircuitBuilder:
+
+        # Turns the lines of the circuit section into component records as they arrive
+        # the section is stripped as a whole, so a line is only processed once the next
+        # non blank line arrives (or the section ends) and blank lines inside the section
+        # are still processed (and rejected) as they would be after section.strip().split('\n')
+        # with as_array the fields of each line are kept in rows instead, any line that is not
+        # plain marks the builder irregular and the netlist is parsed again without as_array
+        # every ROW_BLOCK rows are converted into a block of the component array, so only the
+        # arrays (not a string per field) are held for a large circuit
+
+        def __init__(self, extract, as_array=False):
+            self.extract = extract
+            self.rows = [] if as_array else None
+            self.blocks = []
+            self.irregular = False
+            self.records = []
+            self.failed = False
+            self.message = None
+            self.started = False
+            self.held = None
+            self.blank = []
+
+        def add(self, line):
+            if not line.strip():
+                if self.started:
+                    self.blank.append(line)
+                return
+            if not self.started:
+                self.started = True
+                line = line.lstrip()
+            if self.held is not None:
+                self.process(self.held)
+            for blank in self.blank:
+                self.process(blank)
+            self.blank = []
+            self.held = line
+
+        def finish(self):
+            self.process(self.held.rstrip() if self.held is not None else '')
+            if self.rows is not None and not self.irregular:
+                if self.rows:
+                    self.convert_rows()
+                if not self.irregular:
+                    self.records = self.join_blocks()
+
+        def convert_rows(self):
+            # The rows held so far become the next block of the component array
+            block = self.extract.component_array(self.rows)
+            if block is None:
+                self.irregular = True
+            self.blocks.append(block)
+            self.rows = []
+
+        def join_blocks(self):
+            # Each block is released once it is copied, so the blocks and the whole array
+            # are not both held (the pages of numpy.empty are only taken as they are written)
+            import numpy
+            if len(self.blocks) == 1:
+                return self.blocks.pop()
+            records = numpy.empty(sum(map(len, self.blocks)), dtype=COMPONENT_FIELDS)
+            position = 0
+            self.blocks.reverse()
+            while self.blocks:
+                block = self.blocks.pop()
+                records[position:position + len(block)] = block
+                position += len(block)
+            return records
+
+        def process(self, component):
+            if self.rows is not None:
+                if self.irregular:
+                    return
+                if not self.extract.component_columns(component, self.rows):
+                    self.irregular = True
+                elif len(self.rows) >= self.extract.ROW_BLOCK:
+                    self.convert_rows()
+                return
+            if self.failed or self.message is not None:
+                # Only the first bad line is reported, as process_circuit_data stops there
+                return
+            try:
+                record = self.extract.component_record(component)
+            except ComponentValueException as error:
+                self.message = str(error)
+                self.failed = True
+                return
+            except Exception:
+                self.failed = True
+                return
+            if record is None:
+                #This will occur if a component has an incompatable type or value
+                self.message = f"Value in '{component}' is not in supported format"
+                self.records = []
+                return
+            self.records.append(record)
 
     def remove_comments(self, text):
         """
@@ -149,42 +397,68 @@ class DataExtract:
         return data
     
 
-    def node_helper(self, matches):
-        node_dict = {}
-        for name, value in matches:
-            node_dict[name] = int(value)
-        return node_dict
-    
-    def value_helper(self, matches):
-        val_dict = {}
-        for name, value in matches:
-            try: 
-            # Store the component value and type and store each of them in the variables dict
-                compVal = float(value)
-                type = str(name)
-                val_dict['type'] = type
-                val_dict['value'] = compVal
-            except ValueError:
+    def component_columns(self, component, rows):
+        match = self.LINE_PATTERN.match(component)
+        if match is None:
+            return False
+        nodes, name, number, separator, prefix = match.groups()
+        plain_nodes = self.PLAIN_NODES_PATTERN.fullmatch(nodes)
+        if plain_nodes is None or number is None or name not in COMPONENT_TYPES:
+            return False
+        if not (prefix and separator in ' '):
+            prefix = ''
+        elif 'e' in number:
+            # A prefix after an exponent is an error, left to component_record to report
+            return False
+        rows.append((plain_nodes.group(1), plain_nodes.group(2), name, number, prefix))
+        return True
+
+    def component_array(self, rows):
+        # Each column is converted in one pass, a prefix is looked up once for the whole
+        # column and applied the same way as component_record (by appending its exponent
+        # to the number) so the values are identical
+        import numpy
+        n1, n2, types, numbers, prefixes = zip(*rows)
+        exponents = {'': '', **self.conversionDict}
+        components = numpy.empty(len(rows), dtype=COMPONENT_FIELDS)
+        try:
+            components['n1'] = numpy.fromiter(map(int, n1), numpy.int64, len(rows))
+            components['n2'] = numpy.fromiter(map(int, n2), numpy.int64, len(rows))
+        except OverflowError:
+            return None
+        components['type'] = numpy.fromiter(map(COMPONENT_TYPES.index, types), numpy.int8, len(rows))
+        components['value'] = numpy.fromiter(map(float, map(operator.add, numbers, map(exponents.__getitem__, prefixes))), numpy.float64, len(rows))
+        # A zero or infinite value goes through the list of dicts, ComponentTable.from_records then
+        # decides whether the circuit can be solved with it
+        if not (numpy.isfinite(components['value']).all() and components['value'].all()):
+            return None
+        return components
+
+    def component_record(self, component):
+        match = self.LINE_PATTERN.match(component)
+        if match is None:
+            raise ValueError(f"Component '{component}' could not be read")
+        nodes, name, number, separator, prefix = match.groups()
+        matches_nodes = self.NODE_PATTERN.findall(nodes)
+        if not matches_nodes or number is None:
+            return None
+        record = {}
+        for node, value in matches_nodes:
+            record[node] = int(value)
+        # A prefix only counts when it follows the value directly or after a space
+        if prefix and separator in ' ':
+            try:
                 # Attempt this conversion again using the powers of 10 prefix
-                try:
-                    count = 0
-                    for fix, exp in self.conversionDict.items():
-                        if fix in value:
-                            count +=1
-                            new_value = value + exp
-                            new_value = new_value.replace(fix,'')
-                            val_dict['value'] = float(new_value)
-                            val_dict['type'] = str(name)
-                    if count ==0:
-                        raise ValueError
-                except ValueError:
-                    #This will occur if a component has an incompatable type or value
-                    print(f"Value for '{name}' is not in supported format: '{value}'")
-                    component_data = []
-                    return component_data
-        return val_dict
-
-
+                record['value'] = float(number + self.conversionDict[prefix])
+            except ValueError:
+                #This will occur if a component has an incompatable type or value
+                raise ComponentValueException(f"Value for '{name}' is not in supported format: '{number}{prefix}'")
+            record['type'] = name
+        else:
+            # Store the component value and type and store each of them in the record
+            record['type'] = name
+            record['value'] = float(number)
+        return record
 
     def process_circuit_data(self, circuit_data):
         """
@@ -199,31 +473,20 @@ class DataExtract:
         []
         """
         component_data = []
-        # Define regular extression that matches the formatting of the input file
-        pattern_nodes = r'(\w+)=(\S+)'
-        pattern_value = r'(\w+)=(\d+(?:\.\d+)?(?:e[+-]?\d+)?[numkMG]?[HVA]?)'
-
         # Iterate through each component in the circuit
         # Components can be defined as a line in the circuit section
         for component in circuit_data:
-            # Isolate all matches in the component line
-            pattern = r'^(.*?)(\s\w+=(?:\d+(?:\.\d+)?(?:e[+-]?\d+)?|[a-zA-Z]+)\s?[numkMG]?[HVA]?)$'
-            match = re.search(pattern, component)
-            nodes_string = match.group(1)
-            value_string = match.group(2).replace(' ','')
-            matches_nodes = re.findall(pattern_nodes, nodes_string)
-            matches_value = re.findall(pattern_value, value_string)
-            if matches_nodes and matches_value:
-                # Iterate through each match of the RegEx
-                nodes = self.node_helper(matches_nodes)
-                val = self.value_helper(matches_value)
-                combined_dict = {**nodes, **val}
-                component_data.append(combined_dict)
-            else:
+            try:
+                record = self.component_record(component)
+            except ComponentValueException as error:
+                print(error)
+                raise
+            if record is None:
                 #This will occur if a component has an incompatable type or value
                 print(f"Value in '{component}' is not in supported format")
                 component_data = []
                 return component_data
+            component_data.append(record)
         return component_data
 
     def process_terms_data(self,terms_data):
@@ -237,13 +500,11 @@ class DataExtract:
         Value for 'Nfreqs' is not in supported format: 'error'
         {}
         """
-        # Define regular extression that matches the formatting of the input file
-        pattern = r'(\b\w+\b)=(\S+)'
         # Join the section together so we dont need to iterate through each line
         # Remove this later!!!!
         combined_string = ' '.join(terms_data)
         # Isolate all matches in the string
-        matches = re.findall(pattern, combined_string)
+        matches = self.TERMS_PATTERN.findall(combined_string)
         variables = {}
         # Iterate through each match of the RegEx
         for name, value in matches:
@@ -273,10 +534,8 @@ class DataExtract:
         >>> extract.process_output_data(['Hello hi', 'Farewell bye'])
         {'Hello': 'hi', 'Farewell': 'bye'}
         """
-        # Define regular extression that matches the formatting of the input file
-        pattern = r'(\w+)\s*(\w+)?'
         # Isolate all matches in the string cast of the section
-        matches = re.findall(pattern, str(output_data))
+        matches = self.OUTPUT_PATTERN.findall(str(output_data))
         variables = {}
         # Iterate through matches
         for name, unit in matches:
@@ -285,10 +544,6 @@ class DataExtract:
         return variables
 
 
-Txt_Data = DataExtract('b_RC.net')
-print(Txt_Data.formatted_Circ_Values)
-
-
 '''
 if __name__ == "__main__":
     import doctest
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled plans of netlists, so a netlist that has not changed is not parsed or sorted again
+
+Set NETLIST_PLANS=1 to turn plans on for main.solve_file ("python main.py --no-cache ..."
+skips them along with the result cache). The first run of <name>.net writes <name>.net.plan.npz
+next to it, holding the components already in cascade order (a component array, see
+net_reader.COMPONENT_FIELDS), the terminations and sweep, the output spec and the messages
+the parser printed. Later runs read the arrays straight from the plan, print the messages
+again and hand the components to Circ(ordered=True), so nothing is parsed or sorted.
+
+A plan is used while the netlist has the mtime and size it was compiled from. When they
+differ the netlist is hashed, and the plan is still used (and the new mtime recorded) if the
+content is the same, otherwise the netlist is parsed again and the plan rewritten.
+Plans are written to a temporary file and renamed into place.
+"""
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import contextlib
+import numpy
+from net_reader import DataExtract, COMPONENT_FIELDS
+from result_cache import captured
+
+PLAN_VARIABLE = 'NETLIST_PLANS'
+PLAN_SUFFIX = '.plan.npz'
+# Change when what DataExtract reads from a netlist changes, so old plans are compiled again
+PLAN_VERSION = 1
+
+
+class CompiledNetlist:
+
+    """
+    Class with argument atributes Circ_Values:numpy.array(COMPONENT_FIELDS) Term_Values:dict Outputs:dict
+    What the solver reads from a DataExtract, loaded from a plan
+    the components are already in cascade order (components_ordered)
+    """
+
+    components_ordered = True
+
+    def __init__(self, Circ_Values, Term_Values, Outputs):
+        self.formatted_Circ_Values = Circ_Values
+        self.formatted_Term_Values = Term_Values
+        self.formatted_Outputs = Outputs
+
+
+def plans_enabled():
+    return os.environ.get(PLAN_VARIABLE, '') not in ['', '0']
+
+
+def plan_path(net_file):
+    return net_file + PLAN_SUFFIX
+
+
+def file_digest(net_file):
+    digest = hashlib.sha256()
+    with open(net_file, 'rb') as net:
+        for block in iter(lambda: net.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_plan(net_file):
+    # (meta, components) of the plan of net_file, None if there is no usable plan
+    try:
+        with numpy.load(plan_path(net_file)) as plan:
+            meta = json.loads(str(plan['meta']))
+            if meta['version'] != PLAN_VERSION:
+                return None
+            return meta, plan['components']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_plan(net_file, meta, components):
+    directory = os.path.dirname(os.path.abspath(net_file))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as plan:
+            numpy.savez(plan, meta=numpy.array(json.dumps(meta)), components=components)
+        os.replace(temp_path, plan_path(net_file))
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def compile_components(Circ_Values):
+    """ The components of a DataExtract as a component array in cascade order
+    :param Circ_Values - formatted_Circ_Values (component array or list of dicts)
+    :return numpy.array(COMPONENT_FIELDS)
+    """
+    from circuit import ComponentTable
+    table = ComponentTable.from_records(Circ_Values)
+    table = table.take(table.Order())
+    components = numpy.empty(len(table), dtype=COMPONENT_FIELDS)
+    components['n1'], components['n2'] = table.Pin1, table.Pin2
+    components['type'], components['value'] = table.Type, table.Value
+    return components
+
+
+def compile_netlist(net_file):
+    """ Read net_file through its plan, compiling the plan when there is none or it is out of date
+    :param net_file - path of the .net file
+    :return CompiledNetlist (or the DataExtract when the netlist cannot be compiled)
+    """
+    stat = os.stat(net_file)
+    plan = read_plan(net_file)
+    digest = None
+    if plan is not None:
+        meta, components = plan
+        same_file = (meta['mtime_ns'], meta['size']) == (stat.st_mtime_ns, stat.st_size)
+        if not same_file:
+            digest = file_digest(net_file)
+        if same_file or meta['sha256'] == digest:
+            if not same_file:
+                # Touched but not changed, record the new mtime so it is not hashed again
+                meta['mtime_ns'], meta['size'] = stat.st_mtime_ns, stat.st_size
+                with contextlib.suppress(OSError):
+                    write_plan(net_file, meta, components)
+            sys.stdout.write(meta['log'])
+            return CompiledNetlist(components, meta['terms'], meta['outputs'])
+    if digest is None:
+        digest = file_digest(net_file)
+    Txt_Data, log = captured(lambda: DataExtract(net_file, as_array= True))
+    try:
+        components = compile_components(Txt_Data.formatted_Circ_Values)
+        meta = {'version': PLAN_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest,
+                'log': log, 'terms': Txt_Data.formatted_Term_Values, 'outputs': Txt_Data.formatted_Outputs}
+        write_plan(net_file, meta, components)
+    except Exception:
+        # A netlist that cannot be solved (or a directory that cannot be written) is simply not compiled
+        pass
+    return Txt_Data
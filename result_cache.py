@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of solved netlists, addressed by their content
+
+Set NETLIST_CACHE_DIR to a directory to turn the cache on for main.solve_file, solve_text
+and solve_table (and so for main.py, batch_runner.py, solver_daemon.py and async_solver.py),
+NETLIST_CACHE_MB bounds its size (default 1024). "python main.py --no-cache ..." or
+use_cache=False bypasses it for one run.
+
+The key is a hash of the netlist with its comment lines removed, the same lines
+DataExtract.remove_comments drops, so it covers the <CIRCUIT> components, the <TERMS>
+sweep and the <OUTPUT> spec, and editing a comment does not miss. On a hit the finished
+csv file (or the npy table of solve_table) is returned without parsing or solving anything,
+and the messages the parser printed when the netlist was first solved are printed again.
+
+Each entry is one file, a line of JSON (the parser messages and anything else needed to
+rebuild the result) followed by the bytes of the result. Entries are written to a temporary
+file in the cache directory and renamed into place, so workers sharing the directory never
+see half an entry. A hit touches the entry's mtime, and once the entries take more than the
+size bound the least recently used are removed. Each process keeps a running total of the entry
+sizes and only scans the directory when that total goes over the bound.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+CACHE_DIR_VARIABLE = 'NETLIST_CACHE_DIR'
+CACHE_SIZE_VARIABLE = 'NETLIST_CACHE_MB'
+# Change when the solver or the exporter changes what it writes, so old entries are not used
+CACHE_VERSION = '1'
+# A temporary file older than this is not an entry being written, it is removed when the directory is scanned
+STALE_TEMP_SECONDS = 3600
+# Fraction of the size bound the entries are cut down to when they go over it
+EVICT_TO = 0.9
+
+
+def netlist_key(lines, kind):
+    """ Hash of the lines DataExtract reads, the comment lines left out
+    :param lines - iterable of text, each piece may hold several lines (a file or a whole netlist)
+    :param kind - what is cached for the netlist, 'csv' or 'npy' (with ' periodic' after it for main's periodic cascade)
+    :return hex string
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION}\n{kind}\n".encode())
+    for piece in lines:
+        # splitlines breaks lines exactly where remove_comments breaks the whole text
+        for line in piece.splitlines():
+            if not line.lstrip().startswith('#'):
+                digest.update(line.encode('utf-8', 'surrogatepass'))
+                digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def file_key(file_name, kind):
+    # The file is hashed one line at a time, the same key as netlist_key of its text
+    with open(file_name, 'r') as net_file:
+        return netlist_key(net_file, kind)
+
+
+def captured(parse):
+    """ Call parse() and return (its result, what it printed), the text is printed as well """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = parse()
+    sys.stdout.write(log.getvalue())
+    return result, log.getvalue()
+
+
+class ResultCache:
+
+    """
+    Directory of results keyed by netlist_key
+
+    :def get
+
+        (meta, result bytes) of a key, None on a miss
+
+    :def copy_to
+
+        Write the result of a key to file_path, returns meta (None on a miss)
+
+    :def put / put_file
+
+        Store meta with result bytes, or with the contents of a file
+
+    :def evict
+
+        Scan the directory, remove the least recently used entries until they fit in EVICT_TO
+        of max_bytes and remove temporary files left behind by writes that never finished
+        called on the first write and then only when the running total goes over max_bytes
+    """
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Size of the entries as far as this process knows, None until the directory is first scanned
+        # other workers add entries too, so the directory is scanned again whenever this goes over max_bytes
+        self.total = None
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.entry')
+
+    def open_entry(self, key):
+        # The entry positioned at its result and its meta, None on a miss
+        try:
+            entry = open(self.path(key), 'rb')
+        except OSError:
+            return None
+        try:
+            meta = json.loads(entry.readline())
+            os.utime(entry.fileno())
+        except (OSError, ValueError):
+            entry.close()
+            return None
+        return entry, meta
+
+    def get(self, key):
+        opened = self.open_entry(key)
+        if opened is None:
+            return None
+        entry, meta = opened
+        with entry:
+            return meta, entry.read()
+
+    def copy_to(self, key, file_path):
+        opened = self.open_entry(key)
+        if opened is None:
+            return None
+        entry, meta = opened
+        with entry, open(file_path, 'wb') as output_file:
+            shutil.copyfileobj(entry, output_file, 1 << 20)
+        return meta
+
+    def write_entry(self, key, meta, write_result):
+        # Write to a temporary file next to the entry and rename it into place
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as entry:
+                entry.write(json.dumps(meta).encode() + b'\n')
+                write_result(entry)
+                size = entry.tell()
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        with self.lock:
+            if self.total is not None:
+                self.total += size
+            if self.total is None or self.total > self.max_bytes:
+                self.evict()
+
+    def put(self, key, meta, result):
+        self.write_entry(key, meta, lambda entry: entry.write(result))
+
+    def put_file(self, key, meta, file_path):
+        def write_result(entry):
+            with open(file_path, 'rb') as result_file:
+                shutil.copyfileobj(result_file, entry, 1 << 20)
+        self.write_entry(key, meta, write_result)
+
+    def evict(self):
+        entries = []
+        stale = time.time() - STALE_TEMP_SECONDS
+        for item in os.scandir(self.directory):
+            with contextlib.suppress(OSError):
+                if item.name.endswith('.entry'):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+                elif item.name.endswith('.tmp') and item.stat().st_mtime < stale:
+                    # left behind by a worker that stopped while writing an entry
+                    os.remove(item.path)
+        total = sum(size for _, size, _ in entries)
+        # Once over the bound go down to EVICT_TO of it, so the next few writes do not scan again
+        target = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * EVICT_TO)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            # another worker may have removed it already
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            total -= size
+        self.total = total
+
+
+_caches = {}
+
+
+def default_cache():
+    """ The ResultCache named by NETLIST_CACHE_DIR, None when the variable is not set """
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if not directory:
+        return None
+    max_bytes = int(float(os.environ.get(CACHE_SIZE_VARIABLE, 1024)) * (1 << 20))
+    if (directory, max_bytes) not in _caches:
+        _caches[(directory, max_bytes)] = ResultCache(directory, max_bytes)
+    return _caches[(directory, max_bytes)]
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Long running solver that keeps the library loaded between netlists
+
+Usage: python solver_daemon.py --stdin
+       python solver_daemon.py --socket <path> [BatchWindow_ms]
+
+--stdin          read one JSON request per line on stdin, write one JSON reply per line on stdout
+--socket <path>  listen on a Unix socket, each connection speaks the same line protocol
+[BatchWindow_ms] how long to wait for more requests once one has arrived, defaults to 0 (only the requests
+                 already waiting are batched, so a lone request is not delayed)
+
+Request:  {"id": 1, "netlist": "<text of a .net file>"}   or   {"id": 1, "path": "b_RC.net"}
+          optional "format": "csv" (default) or "npy"
+          optional "cache": false to solve the netlist even if the result cache (NETLIST_CACHE_DIR) holds it
+          optional "periodic": true to cascade repeated runs of identical cells by matrix powers (main.py --periodic)
+Reply:    {"id": 1, "status": "ok", "csv": "<text of the output file>", "seconds": 0.0004}
+          with "format": "npy" the reply holds "header" (the csv header text) and "npy", the
+          base64 of numpy.save of the table behind the csv rows (float64, one row per frequency)
+          status is 'ok', 'empty' (the csv file would be empty) or 'error' (with "error")
+          anything the solver prints (e.g. parse errors) is returned in "log"
+
+numpy, the parser, solver and exporter are imported once when the daemon starts.
+Requests are solved on one solver thread; the requests that arrive together (those
+already waiting plus any that arrive within the batch window, up to MAX_BATCH) are
+taken as one batch, a netlist repeated within the batch is solved once, and the
+replies to each connection are written together.
+"""
+import io
+import sys
+import json
+import time
+import queue
+import base64
+import threading
+import traceback
+import contextlib
+import socketserver
+
+import numpy
+import main
+
+MAX_BATCH = 64
+
+
+def solve_request(request):
+    """ Solve one request
+    :param request - dict holding "netlist" or "path", and optionally "format", "cache" and "periodic"
+    :return reply dict without the "id"
+    """
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        if 'netlist' in request:
+            netlist = request['netlist']
+        else:
+            with open(request['path'], 'r') as net_file:
+                netlist = net_file.read()
+        output_format = request.get('format', 'csv')
+        use_cache = request.get('cache', True)
+        periodic = request.get('periodic', False)
+        with contextlib.redirect_stdout(log):
+            if output_format == 'csv':
+                csv_text = main.solve_text(netlist, use_cache=use_cache, periodic=periodic)
+                reply = {'status': 'ok' if csv_text else 'empty', 'csv': csv_text}
+            elif output_format == 'npy':
+                table = main.solve_table(netlist, use_cache=use_cache, periodic=periodic)
+                reply = {'status': 'empty', 'header': '', 'npy': ''}
+                if table is not None:
+                    buffer = io.BytesIO()
+                    numpy.save(buffer, table[1])
+                    reply = {'status': 'ok', 'header': table[0], 'npy': base64.b64encode(buffer.getvalue()).decode('ascii')}
+            else:
+                raise ValueError(f"Unknown format '{output_format}'")
+    except Exception as error:
+        # As on the command line a netlist that cannot be solved gives an empty result
+        reply = {'status': 'error', 'error': f"{type(error).__name__}: {error}", 'csv': ''}
+    reply['seconds'] = time.perf_counter() - start
+    if log.getvalue():
+        reply['log'] = log.getvalue()
+    return reply
+
+
+class SolverDaemon:
+
+    """
+    Queue of requests from every client and the thread that solves them in batches
+
+    :def submit
+
+        Queue one request line, reply is called with the reply line once it is solved
+
+    :def next_batch
+
+        Wait for a request, then collect the others that arrive within batch_window
+
+    :def solve_batch
+
+        Solve each distinct request of a batch once and send every reply
+
+    :def serve_stdin / serve_socket
+
+        Read requests from stdin or from connections to a Unix socket
+    """
+
+    def __init__(self, batch_window=0.0, max_batch=MAX_BATCH):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.solver = threading.Thread(target=self.run, daemon=True)
+        self.solver.start()
+
+    def submit(self, line, reply):
+        # reply(batch_replies) is called once per batch with the reply lines of this client
+        self.requests.put((line, reply))
+
+    def next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.requests.get(timeout=max(deadline - time.perf_counter(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def solve_batch(self, batch):
+        solved = {}
+        replies = {}
+        for line, reply in batch:
+            try:
+                request = json.loads(line)
+                key = (request.get('netlist'), request.get('path'), request.get('format', 'csv'), request.get('cache', True), request.get('periodic', False))
+                if key not in solved:
+                    solved[key] = solve_request(request)
+                answer = {'id': request.get('id'), **solved[key]}
+            except Exception as error:
+                answer = {'id': None, 'status': 'error', 'error': f"Bad request: {error}", 'csv': ''}
+            replies.setdefault(reply, []).append(json.dumps(answer) + '\n')
+        for reply, lines in replies.items():
+            try:
+                reply(''.join(lines))
+            except OSError:
+                # The client has gone, the other clients of the batch still get their replies
+                pass
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                self.solve_batch(batch)
+            except Exception:
+                # One failed batch must not stop the only solver thread, later requests would wait forever
+                traceback.print_exc(file=sys.stderr)
+
+    def serve_stdin(self, stdin=sys.stdin, stdout=sys.stdout):
+        # Replies are written in the order the requests are solved, match them up by "id"
+        pending = threading.Semaphore(0)
+        count = 0
+
+        def reply(lines):
+            try:
+                stdout.write(lines)
+                stdout.flush()
+            finally:
+                for _ in range(lines.count('\n')):
+                    pending.release()
+
+        for line in stdin:
+            if line.strip():
+                count += 1
+                self.submit(line, reply)
+        # Wait for every reply before returning so none are lost at the end of the input
+        for _ in range(count):
+            pending.acquire()
+
+    def serve_socket(self, path):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                pending = threading.Semaphore(0)
+                lock = threading.Lock()
+                count = 0
+
+                def reply(lines):
+                    # pending is released even if the client has disconnected, so handle still returns
+                    try:
+                        with lock:
+                            self.wfile.write(lines.encode())
+                            self.wfile.flush()
+                    finally:
+                        for _ in range(lines.count('\n')):
+                            pending.release()
+
+                for line in self.rfile:
+                    if line.strip():
+                        count += 1
+                        daemon.submit(line.decode(), reply)
+                # the connection is closed when handle returns, so wait for the replies first
+                for _ in range(count):
+                    pending.acquire()
+
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+            print(f"Solver listening on {path}", file=sys.stderr)
+            server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == '--stdin':
+        SolverDaemon().serve_stdin()
+    elif len(sys.argv) in [3, 4] and sys.argv[1] == '--socket':
+        SolverDaemon(batch_window=float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.0).serve_socket(sys.argv[2])
+    else:
+        print("Usage: python solver_daemon.py --stdin")
+        print("       python solver_daemon.py --socket <path> [BatchWindow_ms]")
+        sys.exit(1)
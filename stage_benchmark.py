@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Times each stage of the solver on synthetic netlists and writes the results as JSON
+
+Usage: python stage_benchmark.py <results.json> [Sections] [Nfreqs] [Mix] [Repeats]
+
+<results.json> where the results are written
+[Sections]     comma separated numbers of ladder sections, one netlist each,
+               defaults to 10,100,1000,10000,100000
+[Nfreqs]       number of frequencies in the sweep of every netlist, defaults to 100
+[Mix]          component types of the sections as <series types>/<shunt types>, defaults to RL/CG
+               each section has one series component of a type picked from the letters before
+               the / and one shunt component picked from the letters after it, a letter given
+               twice is picked twice as often and an empty side leaves that component out,
+               e.g. R/ is a chain of resistors and LLC/G mostly inductors in series
+[Repeats]      times each stage is run, defaults to 3
+
+The netlists are generated with a fixed seed so every run (and every version of the solver)
+times the same circuits. For each netlist the stages are timed separately:
+
+parse:   DataExtract(net_file, as_array=True)
+circ:    Circ construction, sorting, impedances, cascade and every output (not lazy);
+         the impedance cache is cleared first so each run solves from scratch
+outputs: Circ.get_Ordered_Outputs for the <OUTPUT> section (dB conversion)
+export:  CircResultsExporter.export_to_csv
+
+The JSON holds the python and numpy versions, the settings and, for every netlist, the
+time of each run of each stage with the best and median, so results can be compared
+between versions of the solver.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import platform
+import tempfile
+import contextlib
+import statistics
+import numpy
+import main
+
+DEFAULT_SECTIONS = [10, 100, 1000, 10000, 100000]
+DEFAULT_MIX = "RL/CG"
+# Values are picked log-uniformly between these limits
+VALUE_RANGES = {'R': (10.0, 1e3), 'G': (1e-3, 1e-1), 'L': (1e-7, 1e-4), 'C': (1e-10, 1e-7)}
+TERMS = "VT=5 RS=50\nRL=50\nFstart=10.0 Fend=10e+6 Nfreqs=%d\n"
+OUTPUTS = ["Vin V", "Vout dBV", "Iin A", "Iout dBA", "Pin W", "Zout Ohms", "Pout dBW", "Zin Ohms", "Av dB", "Ai"]
+STAGES = ['parse', 'circ', 'outputs', 'export']
+SEED = 2024
+
+
+def parse_mix(mix):
+    """ Split a Mix argument into the series and shunt component types
+    :param mix - string <series types>/<shunt types> e.g. RL/CG
+    :return (series types, shunt types) strings, raises ValueError if the mix is not valid
+    """
+    series, slash, shunt = mix.partition('/')
+    if not slash or not (series or shunt) or set(series + shunt) - set(VALUE_RANGES):
+        raise ValueError("Mix should be <series types>/<shunt types> using the letters %s, not %r" % (''.join(VALUE_RANGES), mix))
+    return series, shunt
+
+
+def synthetic_netlist(sections, nfreqs, mix=DEFAULT_MIX, seed=SEED):
+    """ Text of a ladder netlist with the given number of sections
+    :param sections - number of sections, each adds its series and/or shunt component
+    :param nfreqs - Nfreqs of the <TERMS> section
+    :param mix - component types, see parse_mix
+    :param seed - seed of the component types and values
+    :return string
+    """
+    series, shunt = parse_mix(mix)
+    rng = random.Random(seed)
+
+    def component(n1, n2, types):
+        Type = rng.choice(types)
+        low, high = VALUE_RANGES[Type]
+        return "n1=%d n2=%d %s=%.4g\n" % (n1, n2, Type, low * (high / low) ** rng.random())
+
+    lines = ["<CIRCUIT>\n"]
+    node = 1
+    for _ in range(sections):
+        if series:
+            lines.append(component(node, node + 1, series))
+            node += 1
+        if shunt:
+            lines.append(component(node, 0, shunt))
+    lines.append("</CIRCUIT>\n\n<TERMS>\n" + TERMS % (nfreqs) + "</TERMS>\n\n<OUTPUT>\n")
+    lines.extend(output + "\n" for output in OUTPUTS)
+    lines.append("</OUTPUT>\n")
+    return ''.join(lines)
+
+
+def time_stage(func, repeats):
+    """ Run func repeats times
+    :return (list of the times taken in seconds, the result of the last run)
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def bench_netlist(net_file, output_file, repeats):
+    """ Time every stage of the pipeline for one netlist
+    :param net_file - netlist to solve
+    :param output_file - csv file written by the export stage
+    :param repeats - times each stage is run
+    :return dict mapping each of STAGES to its list of times
+    """
+    from circuit import Circ
+    from csv_writer import CircResultsExporter
+    times = {}
+    # Overflow in a long random ladder is part of the answer, not something to report
+    with contextlib.redirect_stdout(io.StringIO()), numpy.errstate(all='ignore'):
+        times['parse'], Txt_Data = time_stage(lambda: main.DataExtract(net_file, as_array=True), repeats)
+        terms = Txt_Data.formatted_Term_Values
+        Freq = main.frequency_sweep(terms)
+
+        def circ():
+            main.IMPEDANCE_CACHE.clear()
+            return Circ(Txt_Data.formatted_Circ_Values, Freq, terms['RL'], terms['VT'], terms['RS'])
+
+        times['circ'], circuit = time_stage(circ, repeats)
+        times['outputs'], _ = time_stage(lambda: circuit.get_Ordered_Outputs(Txt_Data.formatted_Outputs), repeats)
+        exporter = CircResultsExporter(circuit, Txt_Data.formatted_Outputs)
+        times['export'], _ = time_stage(lambda: exporter.export_to_csv(output_file), repeats)
+    return times
+
+
+def run_benchmark(sections_list, nfreqs, mix, repeats):
+    """ Generate and time one netlist per entry of sections_list, printing a line for each
+    :return dict of the results, as written to the JSON file
+    """
+    results = {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'nfreqs': nfreqs,
+        'mix': mix,
+        'repeats': repeats,
+        'seed': SEED,
+        'netlists': [],
+    }
+    print("Stage benchmark, mix %s, %d frequencies, best of %d" % (mix, nfreqs, repeats))
+    with tempfile.TemporaryDirectory() as directory:
+        for sections in sections_list:
+            net_file = os.path.join(directory, "synthetic_%d.net" % (sections))
+            netlist = synthetic_netlist(sections, nfreqs, mix)
+            with open(net_file, 'w') as net:
+                net.write(netlist)
+            times = bench_netlist(net_file, os.path.join(directory, "synthetic_%d.csv" % (sections)), repeats)
+            stages = {stage: {'best': min(times[stage]), 'median': statistics.median(times[stage]), 'times': times[stage]}
+                      for stage in STAGES}
+            results['netlists'].append({'sections': sections, 'components': netlist.count('n1='),
+                                        'netlist_bytes': len(netlist.encode()), 'stages': stages})
+            print("%7d sections  " % (sections) + "  ".join("%s %9.4f s" % (stage, stages[stage]['best']) for stage in STAGES))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 6:
+        print("Usage: python stage_benchmark.py <results.json> [Sections] [Nfreqs] [Mix] [Repeats]")
+        sys.exit(1)
+    Sections = [int(sections) for sections in sys.argv[2].split(',')] if len(sys.argv) > 2 else DEFAULT_SECTIONS
+    Nfreqs = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    Mix = sys.argv[4] if len(sys.argv) > 4 else DEFAULT_MIX
+    Repeats = int(sys.argv[5]) if len(sys.argv) > 5 else 3
+    try:
+        parse_mix(Mix)
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
+    Results = run_benchmark(Sections, Nfreqs, Mix, Repeats)
+    with open(sys.argv[1], 'w') as results_file:
+        json.dump(Results, results_file, indent=1)
+    print("Results written to %s" % (sys.argv[1]))
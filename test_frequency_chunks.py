@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of main.frequency_chunks against main.frequency_sweep
+
+Run with: python -m pytest test_frequency_chunks.py   (or python -m unittest test_frequency_chunks)
+"""
+import unittest
+import numpy
+import main
+
+CHUNK_SIZES = [1, 2, 3, 7, 16, 16384]
+NFREQS = [0, 1, 2, 3, 10, 100, 1001]
+LINEAR_SWEEPS = [(10.0, 10e+6), (1, 1000), (5e+3, 5e+3), (1e+6, 10.0), (0.0, 1.0)]
+LOG_SWEEPS = [(10.0, 10e+6), (1, 1000), (5e+3, 5e+3), (1e+6, 10.0), (0.3, 7.7e+9)]
+
+
+class FrequencyChunksTest(unittest.TestCase):
+
+    def assertSameSweep(self, Term_Values):
+        for chunk_size in CHUNK_SIZES:
+            with self.subTest(Term_Values=Term_Values, chunk_size=chunk_size):
+                chunks = list(main.frequency_chunks(Term_Values, chunk_size))
+                self.assertTrue(all(len(chunk) <= chunk_size for chunk in chunks))
+                # Nfreqs=0 gives no chunks at all
+                frequencies = numpy.concatenate(chunks or [numpy.empty(0)])
+                self.assertTrue(numpy.array_equal(frequencies, main.frequency_sweep(Term_Values)))
+
+    def test_linear_sweep(self):
+        for Fstart, Fend in LINEAR_SWEEPS:
+            for Nfreqs in NFREQS:
+                self.assertSameSweep({'Fstart': Fstart, 'Fend': Fend, 'Nfreqs': Nfreqs})
+
+    def test_log_sweep(self):
+        for LFstart, LFend in LOG_SWEEPS:
+            for Nfreqs in NFREQS:
+                self.assertSameSweep({'LFstart': LFstart, 'LFend': LFend, 'Nfreqs': Nfreqs})
+
+    def test_negative_nfreqs(self):
+        # Fails before any chunk is asked for, so nothing is solved
+        with self.assertRaises(ValueError):
+            main.frequency_chunks({'Fstart': 10.0, 'Fend': 10e+6, 'Nfreqs': -1}, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of solver_daemon.py over its Unix socket
+
+Run with: python -m pytest test_solver_daemon.py   (or python -m unittest test_solver_daemon)
+"""
+import os
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from solver_daemon import SolverDaemon
+
+NETLIST_FILE = "./User_files/b_RC.net"
+
+
+class SocketDisconnectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "solver.sock")
+        # A batch window long enough for the first client to go before its batch is solved
+        daemon = SolverDaemon(batch_window=0.3)
+        threading.Thread(target=daemon.serve_socket, args=(self.path,), daemon=True).start()
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            threading.Event().wait(0.05)
+        with open(NETLIST_FILE, 'r') as net_file:
+            self.netlist = net_file.read()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def connect(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(10)
+        client.connect(self.path)
+        return client
+
+    def request(self, request_id):
+        return (json.dumps({'id': request_id, 'netlist': self.netlist}) + '\n').encode()
+
+    def test_client_disconnecting_mid_batch(self):
+        # The first client sends a request and disconnects before its reply is written
+        gone = self.connect()
+        gone.sendall(self.request(1))
+        gone.close()
+        # Later clients are still answered, by the same solver thread
+        for request_id in [2, 3]:
+            with self.connect() as client:
+                client.sendall(self.request(request_id))
+                client.shutdown(socket.SHUT_WR)
+                reply = json.loads(client.makefile('r').readline())
+            self.assertEqual(reply['id'], request_id)
+            self.assertEqual(reply['status'], 'ok')
+
+
+if __name__ == "__main__":
+    unittest.main()
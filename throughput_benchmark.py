@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the whole solver over the User_files corpus, checked against Model_files
+
+Usage: python throughput_benchmark.py <results.json> [Runs] [Baseline.json] [MaxDrop]
+
+<results.json>  where the results of this run are written
+[Runs]          times every netlist is solved, defaults to 5
+[Baseline.json] results of an earlier run to compare with, if the file does not exist
+                the results of this run are written to it and become the baseline
+[MaxDrop]       percentage by which files/s may fall below the baseline, defaults to 10
+
+The corpus is every netlist of the AutoTest_08 suites (a_ to e_) and every Ext_ netlist.
+Each one is solved once untimed (so imports are not counted) and then Runs times through
+main.solve_file in this process, bypassing the result cache and compiled plans so every
+run parses and solves. After each run the output is compared with its model file the
+way AutoTest_08 does (filecmp, then test_equality with ABS_TOL and REL_TOL), outside the
+timed part.
+
+Printed and written: files/s (files solved divided by the time spent solving them), the
+total CPU time, p50/p95/p99 latency over every solve and per file, and which files did not
+agree with their model. With a baseline the exit status is 1 if files/s fell by more than
+MaxDrop percent, or if a file that agreed with its model in the baseline no longer does.
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import tempfile
+import contextlib
+import numpy
+import main
+import AutoTest_08
+
+EXT_TESTS = ["Ext_a_Test_Circuit_1", "Ext_d_LPF_B50", "Ext_e_Ladder_100", "Ext_e_Ladder_400", "Ext_mdB_a_Test_Circuit_1"]
+ABS_TOL = 1e-13
+REL_TOL = 1e-13
+PERCENTILES = [50, 95, 99]
+
+
+def corpus():
+    """ Base names of every netlist in the corpus, the AutoTest_08 suites then the Ext_ netlists """
+    return [basename for suite in AutoTest_08.suites for basename in suite] + EXT_TESTS
+
+
+def latency_summary(times):
+    # p50/p95/p99 and the mean of a list of times
+    summary = dict(zip(['p%d' % (q) for q in PERCENTILES], numpy.percentile(times, PERCENTILES).tolist()))
+    summary['mean'] = float(numpy.mean(times))
+    return summary
+
+
+def solve(net_file, output_file):
+    # One run of the pipeline, as main.py would run it without the cache
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.solve_file(net_file, output_file, use_cache=False)
+
+
+def run_corpus(basenames, runs, output_dir):
+    """ Solve every netlist runs times, timing each solve and checking each output
+    :param basenames - netlists to solve, ./User_files/<name>.net with model ./Model_files/<name>_model.csv
+    :param runs - times every netlist is solved
+    :param output_dir - where the csv files are written
+    :return dict of the results, as written to the JSON file
+    """
+    jobs = [("./User_files/%s.net" % (basename), os.path.join(output_dir, "%s.csv" % (basename)),
+             "./Model_files/%s_model.csv" % (basename)) for basename in basenames]
+    for net_file, output_file, _ in jobs:
+        solve(net_file, output_file)
+    wall = {basename: [] for basename in basenames}
+    cpu = dict.fromkeys(basenames, 0.0)
+    correct = dict.fromkeys(basenames, True)
+    for _ in range(runs):
+        for basename, (net_file, output_file, model_file) in zip(basenames, jobs):
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            solve(net_file, output_file)
+            wall[basename].append(time.perf_counter() - start)
+            cpu[basename] += time.process_time() - cpu_start
+            correct[basename] = AutoTest_08.compare_output(io.StringIO(), model_file, output_file, ABS_TOL, REL_TOL) and correct[basename]
+    solve_seconds = sum(sum(times) for times in wall.values())
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'runs': runs,
+        'files': len(basenames),
+        'files_per_second': len(basenames) * runs / solve_seconds,
+        'solve_seconds': solve_seconds,
+        'cpu_seconds': sum(cpu.values()),
+        'latency': latency_summary([t for times in wall.values() for t in times]),
+        'per_file': {basename: dict(latency_summary(wall[basename]), cpu_seconds=cpu[basename], correct=correct[basename])
+                     for basename in basenames},
+        'incorrect': [basename for basename in basenames if not correct[basename]],
+    }
+
+
+def print_results(results):
+    divider_line = '*' * 80
+    print("Throughput benchmark, %d files, %d runs each" % (results['files'], results['runs']))
+    for basename, summary in results['per_file'].items():
+        print("%-32s p50 %9.5f s  p95 %9.5f s  p99 %9.5f s  cpu %8.4f s  %s"
+              % (basename, summary['p50'], summary['p95'], summary['p99'], summary['cpu_seconds'],
+                 'ok' if summary['correct'] else 'INCORRECT'))
+    latency = results['latency']
+    print("%s\n%.1f files/s  cpu %.3f s  latency p50 %.5f s  p95 %.5f s  p99 %.5f s"
+          % (divider_line, results['files_per_second'], results['cpu_seconds'], latency['p50'], latency['p95'], latency['p99']))
+    print("Incorrect files are:", results['incorrect'])
+    print(divider_line)
+
+
+def compare_with_baseline(results, baseline, max_drop):
+    """ Check the results against a baseline, printing what changed
+    :param results - results of this run
+    :param baseline - results of the baseline run
+    :param max_drop - percentage by which files/s may fall
+    :return True if the results pass
+    """
+    drop = 100.0 * (baseline['files_per_second'] - results['files_per_second']) / baseline['files_per_second']
+    newly_incorrect = [basename for basename in results['incorrect'] if basename not in baseline['incorrect']]
+    print("Baseline %.1f files/s (%s), now %.1f files/s, change %+.1f%% (a drop of more than %.1f%% fails)"
+          % (baseline['files_per_second'], baseline['created'], results['files_per_second'], -drop, max_drop))
+    if newly_incorrect:
+        print("Files that agreed with their model in the baseline but no longer do:", newly_incorrect)
+    passed = drop <= max_drop and not newly_incorrect
+    print("PASS" if passed else "FAIL")
+    return passed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 5:
+        print("Usage: python throughput_benchmark.py <results.json> [Runs] [Baseline.json] [MaxDrop]")
+        sys.exit(1)
+    Runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    Baseline_file = sys.argv[3] if len(sys.argv) > 3 else None
+    MaxDrop = float(sys.argv[4]) if len(sys.argv) > 4 else 10.0
+    with tempfile.TemporaryDirectory() as Output_dir:
+        Results = run_corpus(corpus(), Runs, Output_dir)
+    print_results(Results)
+    with open(sys.argv[1], 'w') as results_file:
+        json.dump(Results, results_file, indent=1)
+    print("Results written to %s" % (sys.argv[1]))
+    if Baseline_file is not None:
+        if not os.path.exists(Baseline_file):
+            with open(Baseline_file, 'w') as baseline_out:
+                json.dump(Results, baseline_out, indent=1)
+            print("No baseline found, results written to %s as the baseline" % (Baseline_file))
+        else:
+            with open(Baseline_file, 'r') as baseline_in:
+                Baseline = json.load(baseline_in)
+            if not compare_with_baseline(Results, Baseline, MaxDrop):
+                sys.exit(1)